@@ -1,3 +1,9 @@
+import numpy as np
+
+# Optional, fit_function is linear in its parameters so Least Squares solves it directly instead of iteratively
+linear = True
+
+
 def fit_function(x, a0, a1):
     """
     Fit data to this function.
@@ -6,3 +12,12 @@ def fit_function(x, a0, a1):
     and all the subsequent arguments need to be the fitting parameters.
     """
     return a1 * x + a0
+
+
+def jacobian(x, a0, a1):
+    """
+    Optional, the derivatives of fit_function by each of the parameters, one column per parameter.
+
+    If jacobian is not defined, the Least Squares algorithm estimates it by finite differences.
+    """
+    return np.column_stack([np.ones_like(x), x])
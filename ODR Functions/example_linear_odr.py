@@ -1,3 +1,6 @@
+import numpy as np
+
+
 def fit_function(a, x):
     """
     Fit data to this function.
@@ -5,4 +8,19 @@ def fit_function(a, x):
     For the ODR algorithm the function must take a vector containing the fitting parameters as the first argument
     and x (the free variable) as the second.
     """
-    return a[0] * x + a[1]
\ No newline at end of file
+    return a[0] * x + a[1]
+
+def fjacb(a, x):
+    """
+    Optional, the derivatives of fit_function by each of the parameters, one row per parameter.
+
+    If fjacb and fjacd are not defined, the ODR algorithm estimates them by finite differences.
+    """
+    return np.vstack([x, np.ones_like(x)])
+
+
+def fjacd(a, x):
+    """
+    Optional, the derivative of fit_function by x.
+    """
+    return np.full_like(x, a[0])
@@ -0,0 +1,230 @@
+import numpy as np
+from typing import Callable, List, Union
+
+# d ufunc(v)/dv of the supported single argument ufuncs
+unary_derivatives = {
+    np.negative: lambda v: -np.ones_like(v),
+    np.positive: lambda v: np.ones_like(v),
+    np.exp: np.exp,
+    np.exp2: lambda v: np.exp2(v) * np.log(2),
+    np.expm1: np.exp,
+    np.log: lambda v: 1 / v,
+    np.log2: lambda v: 1 / (v * np.log(2)),
+    np.log10: lambda v: 1 / (v * np.log(10)),
+    np.log1p: lambda v: 1 / (1 + v),
+    np.sqrt: lambda v: 0.5 / np.sqrt(v),
+    np.cbrt: lambda v: 1 / (3 * np.cbrt(v) ** 2),
+    np.square: lambda v: 2 * v,
+    np.reciprocal: lambda v: -1 / v ** 2,
+    np.absolute: np.sign,
+    np.sin: np.cos,
+    np.cos: lambda v: -np.sin(v),
+    np.tan: lambda v: 1 / np.cos(v) ** 2,
+    np.arcsin: lambda v: 1 / np.sqrt(1 - v ** 2),
+    np.arccos: lambda v: -1 / np.sqrt(1 - v ** 2),
+    np.arctan: lambda v: 1 / (1 + v ** 2),
+    np.sinh: np.cosh,
+    np.cosh: np.sinh,
+    np.tanh: lambda v: 1 / np.cosh(v) ** 2,
+    np.arcsinh: lambda v: 1 / np.sqrt(v ** 2 + 1),
+    np.arccosh: lambda v: 1 / np.sqrt(v ** 2 - 1),
+    np.arctanh: lambda v: 1 / (1 - v ** 2),
+}
+
+
+def expand(grad: np.ndarray, ndim: int) -> np.ndarray:
+    """
+    Insert axes after the first (derivative) axis of grad, so it broadcasts against an array of ndim dimensions.
+    """
+    missing = ndim - (grad.ndim - 1)
+    if missing <= 0:
+        return grad
+    return grad.reshape(grad.shape[:1] + (1,) * missing + grad.shape[1:])
+
+
+class Dual:
+    """
+    Forward mode automatic differentiation: a value together with its derivatives by k variables.
+
+    value is an array (or a scalar) and grad is an array of shape (k, *value.shape), where grad[i] is d value/d var_i.
+    NumPy ufuncs and the arithmetic operators propagate the derivatives, so a vectorized NumPy expression evaluated on
+    Duals yields its exact derivatives by all k variables in a single pass over the data.
+    Any operation which is not supported raises a TypeError.
+    """
+    __slots__ = ('value', 'grad')
+    __array_priority__ = 1000  # ndarray <op> Dual must call Dual's reflected operator
+
+    def __init__(self, value, grad):
+        self.value = value
+        self.grad = grad
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        if method != '__call__' or kwargs:
+            return NotImplemented
+
+        if ufunc in unary_derivatives:
+            a, = inputs
+            return Dual(ufunc(a.value), a.grad * unary_derivatives[ufunc](a.value))
+
+        if len(inputs) != 2:
+            return NotImplemented
+
+        a, b = inputs
+        va = a.value if isinstance(a, Dual) else a
+        vb = b.value if isinstance(b, Dual) else b
+        value = ufunc(va, vb)
+        ndim = np.ndim(value)
+
+        # d ufunc/da and d ufunc/db
+        if ufunc is np.add:
+            da, db = 1, 1
+        elif ufunc is np.subtract:
+            da, db = 1, -1
+        elif ufunc is np.multiply:
+            da, db = vb, va
+        elif ufunc in (np.true_divide, np.divide):
+            da, db = 1 / vb, -va / vb ** 2
+        elif ufunc is np.power:
+            da = vb * va ** (vb - 1)
+            db = value * np.log(va) if isinstance(b, Dual) else 0
+        elif ufunc is np.arctan2:
+            da, db = vb / (va ** 2 + vb ** 2), -va / (va ** 2 + vb ** 2)
+        elif ufunc is np.hypot:
+            da, db = va / value, vb / value
+        else:
+            return NotImplemented
+
+        grad = 0
+        if isinstance(a, Dual):
+            grad = grad + expand(a.grad, ndim) * da
+        if isinstance(b, Dual):
+            grad = grad + expand(b.grad, ndim) * db
+        return Dual(value, grad)
+
+    def __getitem__(self, item):
+        if not isinstance(item, tuple):
+            item = (item,)
+        return Dual(self.value[item], self.grad[(slice(None),) + item])
+
+    def __len__(self):
+        return len(self.value)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def shape(self):
+        return np.shape(self.value)
+
+    def __add__(self, other): return np.add(self, other)
+    def __radd__(self, other): return np.add(other, self)
+    def __sub__(self, other): return np.subtract(self, other)
+    def __rsub__(self, other): return np.subtract(other, self)
+    def __mul__(self, other): return np.multiply(self, other)
+    def __rmul__(self, other): return np.multiply(other, self)
+    def __truediv__(self, other): return np.true_divide(self, other)
+    def __rtruediv__(self, other): return np.true_divide(other, self)
+    def __pow__(self, other): return np.power(self, other)
+    def __rpow__(self, other): return np.power(other, self)
+    def __neg__(self): return np.negative(self)
+    def __pos__(self): return self
+    def __abs__(self): return np.absolute(self)
+
+
+def derivatives(result, nvars: int, shape: tuple) -> np.ndarray:
+    """
+    The (nvars, *shape) derivatives of the result of a function evaluated on Duals.
+    """
+    if not isinstance(result, Dual):  # The result does not depend on the variables at all
+        return np.zeros((nvars,) + shape)
+    return np.broadcast_to(expand(result.grad, len(shape)), (nvars,) + shape)
+
+
+def least_squares_jacobian(func: Callable) -> Callable:
+    """
+    jacobian(x, *params) -> (n, p) for curve_fit, of func(x, *params).
+    """
+    def jacobian(x, *params):
+        nparams = len(params)
+        identity = np.eye(nparams)
+        result = func(x, *[Dual(p, identity[i]) for i, p in enumerate(params)])
+        return derivatives(result, nparams, np.shape(x)).T
+
+    return jacobian
+
+
+def odr_jacobians(func: Callable) -> tuple:
+    """
+    fjacb(params, x) -> (p, n) and fjacd(params, x) -> (n,) for scipy.odr, of func(params, x).
+    """
+    def fjacb(params, x):
+        params = np.asarray(params, dtype=np.float64)
+        result = func(Dual(params, np.eye(len(params))), x)
+        return np.ascontiguousarray(derivatives(result, len(params), np.shape(x)))
+
+    def fjacd(params, x):
+        result = func(params, Dual(x, np.ones((1,) + np.shape(x))))
+        return np.ascontiguousarray(derivatives(result, 1, np.shape(x))[0])
+
+    return fjacb, fjacd
+
+
+def derive_jacobians(func: Callable,
+                     method: str,
+                     p0: Union[List[float], np.ndarray],
+                     x: np.ndarray = None,
+                     rtol: float = 1e-4
+                     ) -> dict:
+    """
+    Derive the exact derivatives of a fit function by automatic differentiation.
+
+    The derivatives are checked against finite differences at p0 on x (a small probe grid if x is not given),
+    since a model may use operations which Dual does not support.
+
+    :return: the keyword arguments of Fit which hand the derivatives to the solver of method,
+    an empty dict if the derivatives could not be derived.
+    """
+    if x is None:
+        x = np.linspace(0.5, 2, 8)
+    p0 = np.asarray(p0, dtype=np.float64)
+
+    if method == 'odr':
+        fjacb, fjacd = odr_jacobians(func)
+        kwargs = dict(fjacb=fjacb, fjacd=fjacd)
+        evaluate = func
+        derived = lambda p: fjacb(p, x).T
+    else:
+        jacobian = least_squares_jacobian(func)
+        kwargs = dict(jacobian=jacobian)
+        evaluate = lambda p, x: func(x, *p)
+        derived = lambda p: jacobian(x, *p)
+
+    # Any failure (an unsupported operation, a wrong shape...) falls back to the solvers' finite differences
+    try:
+        with np.errstate(all='ignore'):
+            # Central differences, one column per parameter
+            steps = 1e-6 * np.maximum(np.abs(p0), 1)
+            numeric = np.column_stack([(evaluate(p0 + step, x) - evaluate(p0 - step, x)) / (2 * steps[i])
+                                       for i, step in enumerate(np.diag(steps))])
+            if not derivatives_match(derived(p0), numeric, rtol):
+                return {}
+
+            if method == 'odr':  # ODR also uses d func/d x
+                x_step = 1e-6 * np.maximum(np.abs(x), 1)
+                numeric = (evaluate(p0, x + x_step) - evaluate(p0, x - x_step)) / (2 * x_step)
+                if not derivatives_match(fjacd(p0, x), numeric, rtol):
+                    return {}
+    except Exception:
+        return {}
+    return kwargs
+
+
+def derivatives_match(exact, numeric: np.ndarray, rtol: float) -> bool:
+    """
+    Whether derivatives agree with their finite differences, where both are finite.
+    """
+    exact = np.asarray(exact, dtype=np.float64)
+    if exact.shape != numeric.shape:
+        return False
+    finite = np.isfinite(exact) & np.isfinite(numeric)
+    return np.allclose(exact[finite], numeric[finite], rtol=rtol, atol=rtol * np.abs(numeric[finite]).max(initial=1))
@@ -0,0 +1,124 @@
+import pandas as pd
+import glob
+import os
+from typing import Callable, List, Tuple, Union
+from load_data import LoadData, hdf5_datasets, sheet_names, excel_extensions, hdf5_extensions
+from model_loader import load_model
+from pool import run_pool
+from fit import Fit
+from export import fit_figures, prepare_figures, save_figures, trim_figure_cache
+
+data_extensions = ('.csv', '.npy') + excel_extensions + hdf5_extensions
+
+
+def batch_datasets(pattern: str, all_sheets: bool = False) -> List[Tuple[str, Union[str, int]]]:
+    """
+    Expand a directory or a glob pattern to a list of (path, sheet) datasets.
+
+    A directory stands for every data file inside it.
+    If all_sheets is True every sheet of every workbook, and every dataset of every HDF5 file, is a dataset of its own,
+    otherwise only the first one is.
+    """
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, '*')
+
+    datasets = []
+    for path in sorted(glob.glob(pattern)):
+        if not path.endswith(data_extensions):
+            continue
+        if all_sheets and path.endswith(excel_extensions):
+            datasets += [(path, sheet) for sheet in sheet_names(path)]
+        elif all_sheets and path.endswith(hdf5_extensions):
+            datasets += [(path, name) for name in hdf5_datasets(path)]
+        else:
+            datasets.append((path, 0))
+    return datasets
+
+
+def fit_dataset(dataset: Tuple[str, Union[str, int]],
+                model_path: str,
+                colorder: List[Union[int, None]],
+                p0: List[float],
+                x_range: Union[List[float], None],
+                method: str,
+                headers: bool,
+                auto_jacobian: bool = False,
+                jit: bool = False,
+                export: dict = None
+                ) -> dict:
+    """
+    Fit a single dataset and return its summary row, a failed fit returns a row of its error message.
+
+    :param export: if given, also save the figures of the fit here, see batch_fit
+    """
+    try:
+        model = load_model(model_path, jit)
+
+        path, sheet = dataset
+        loaded = LoadData(path, headers=headers, sheet_name=sheet, columns=[col for col in colorder if col is not None])
+
+        fit = Fit(loaded.data, loaded.colorder(colorder), p0, model.fit_function, x_range, method,
+                  linear=model.linear, **model.derivatives(method, p0, auto_jacobian))
+
+        if export is not None:
+            name = os.path.splitext(os.path.basename(path))[0] + ('' if sheet == 0 else f'_{sheet}'.replace('/', '_'))
+            for fmt in export['formats']:
+                figures = fit_figures(export['report'], export['directory'], name, fmt, export.get('dpi', 100))
+                save_figures(fit, prepare_figures(fit, model_path, figures))
+        return dict(summary_row(fit), error='')
+
+    except Exception as e:
+        return {'error': f'{type(e).__name__}: {e}'}
+
+
+def summary_row(fit: Fit) -> dict:
+    row = {}
+    for i, a in enumerate(fit.ep):
+        row[f'a{i}'] = a
+        row[f'sd_a{i}'] = fit.sd_ep[i]
+    row.update(chi2=fit.chi2, dof=fit.dof, chi2red=fit.chi2red, pvalue=fit.pvalue)
+    return row
+
+
+def batch_fit(datasets: List[Tuple[str, Union[str, int]]],
+              model_path: str,
+              colorder: List[Union[int, None]],
+              p0: List[float],
+              x_range: Union[List[float], None] = None,
+              method: str = 'odr',
+              headers: bool = True,
+              processes: int = None,
+              auto_jacobian: bool = False,
+              jit: bool = False,
+              export: dict = None,
+              callback: Callable[[int, int], None] = None,
+              is_cancelled: Callable[[], bool] = None
+              ) -> pd.DataFrame:
+    """
+    Fit one model to many datasets in parallel, one dataset per task of a process pool.
+
+    :param datasets: (path, sheet) pairs, see batch_datasets
+    :param colorder: [x_col, dx_col, y_col, dy_col] as in Fit, the same columns are used for every dataset
+    :param processes: number of worker processes, defaults to the number of cores
+    :param auto_jacobian: derive the model's derivatives by automatic differentiation, see FitModel.derivatives
+    :param jit: compile the model with Numba, see load_model
+    :param export: save the figures of every fit as well, by the worker which fitted it: a dict of the directory,
+    the formats (e.g ['png', 'pdf']), optionally the dpi, and a report of the plots and their labels (see fit_figures).
+    The figures of a dataset are named after its file (and sheet), e.g '<directory>/data_Fit.png'
+    :param callback: called with (number of finished fits, number of fits) whenever a fit finishes
+    :param is_cancelled: checked whenever a fit finishes, if it returns True the fits which did not start are dropped
+    :return: a table with one row per dataset. A failed fit has its error message in the 'error' column
+    """
+    tasks = [(fit_dataset, (dataset, model_path, colorder, p0, x_range, method, headers, auto_jacobian, jit, export))
+             for dataset in datasets]
+    rows = run_pool(tasks, processes, callback=callback, is_cancelled=is_cancelled)
+
+    if export is not None:
+        trim_figure_cache()
+
+    index = pd.MultiIndex.from_tuples([(path, str(sheet)) for path, sheet in datasets], names=['path', 'sheet'])
+    table = pd.DataFrame([row if row is not None else {'error': 'Cancelled'} for row in rows], index=index)
+
+    # Put the parameters first and the error message last, regardless of which fit finished first
+    columns = [col for col in table.columns if col != 'error'] + ['error']
+    return table.reindex(columns=columns)
@@ -0,0 +1,145 @@
+import numpy as np
+from typing import Callable, List, Union
+from model_loader import load_model
+from pool import run_pool
+from fit import Fit
+
+
+def bootstrap_chunk(data: np.ndarray,
+                    colorder: List[Union[int, None]],
+                    model_values: np.ndarray,
+                    sigma: np.ndarray,
+                    ep: np.ndarray,
+                    method: str,
+                    linear: bool,
+                    model_path: str,
+                    jit: bool,
+                    auto_jacobian: bool,
+                    mode: str,
+                    seed: np.random.SeedSequence,
+                    size: int
+                    ) -> np.ndarray:
+    """
+    Refit size resampled datasets and return their (size, p) parameters, a failed refit is a row of NaN.
+    """
+    model = load_model(model_path, jit)
+    derivatives = model.derivatives(method, ep, auto_jacobian)
+    warm_start = {'ep': ep, 'output': None, 'fingerprint': None}
+    rng = np.random.default_rng(seed)
+
+    npoints = len(data)
+    samples = np.full((size, len(ep)), np.nan)
+    for i in range(size):
+        if mode == 'resample':
+            sample = data[rng.integers(0, npoints, npoints)]
+        else:
+            sample = data.copy()
+            sample[:, [0, 2]] = model_values + rng.standard_normal((npoints, 2)) * sigma
+
+        try:
+            with np.errstate(all='ignore'):
+                fit = Fit(sample, colorder, ep, model.fit_function, None, method, warm_start=warm_start,
+                          linear=linear, **derivatives)
+            samples[i] = fit.ep
+        except Exception:  # e.g curve_fit did not converge, or a resample with too few distinct points
+            pass
+    return samples
+
+
+class Bootstrap:
+    """
+    Parameter uncertainties of a fit by refitting it to many resampled datasets.
+
+    * 'resample': the fitted points are drawn with replacement (nonparametric bootstrap).
+    * 'perturb': every point is drawn around the best fit curve, with normal errors of sd dx and dy (Monte Carlo).
+      Without dy, the y errors are estimated from the scatter of the residuals.
+
+    The refits run on a process pool in chunks, every chunk with its own random stream spawned from one seed,
+    so the results depend only on seed and chunksize and not on the number of processes.
+    Every refit starts from the parameters of the original fit.
+    """
+
+    def __init__(self,
+                 fit: Fit,
+                 model_path: str,
+                 n: int = 1000,
+                 mode: str = 'resample',
+                 seed: Union[int, None] = None,
+                 level: float = 0.6827,
+                 processes: int = None,
+                 chunksize: int = 100,
+                 jit: bool = False,
+                 auto_jacobian: bool = False,
+                 callback: Callable[[int, int], None] = None,
+                 is_cancelled: Callable[[], bool] = None):
+        """
+        :param fit: the fit, its model must be the script at model_path
+        :param n: number of refits
+        :param mode: 'resample' or 'perturb'
+        :param seed: seed of the random streams, None for a random one (see self.seed)
+        :param level: confidence level of the percentile intervals
+        :param processes: number of worker processes, defaults to the number of cores
+        :param chunksize: number of refits per task
+        :param callback: called with (number of finished refits, n) whenever a chunk finishes
+        :param is_cancelled: checked whenever a chunk finishes, if it returns True the chunks which did not start are dropped
+        """
+        if mode not in ('resample', 'perturb'):
+            raise ValueError("'mode' must be 'resample' or 'perturb'")
+
+        self.mode = mode
+        self.ep = np.asarray(fit.ep, dtype=np.float64)
+        self.level = level
+
+        x, dx, y, dy = fit.fitted_data()
+        colorder = [0, None if dx is None else 1, 2, None if dy is None else 3]
+        data = np.column_stack([np.zeros_like(x) if a is None else a for a in (x, dx, y, dy)])
+
+        # The best fit curve at the fitted points, and the spread of the points around it
+        if fit.method == 'odr':
+            model_values = np.column_stack([fit.output.xplus, fit.output.y])
+        else:
+            model_values = np.column_stack([x, fit.fitting_func(x, *fit.ep)])
+        sigma = np.column_stack([np.zeros_like(x) if dx is None else dx,
+                                 np.full_like(y, np.sqrt(fit.chi2red)) if dy is None else dy])
+
+        seed_sequence = np.random.SeedSequence(seed)
+        self.seed = seed_sequence.entropy
+        sizes = [min(chunksize, n - start) for start in range(0, n, chunksize)]
+        tasks = [(bootstrap_chunk, (data, colorder, model_values, sigma, self.ep, fit.method, fit.is_linear, model_path,
+                                    jit, auto_jacobian, mode, child, size))
+                 for child, size in zip(seed_sequence.spawn(len(sizes)), sizes)]
+        chunks = run_pool(tasks, processes, sizes, callback, is_cancelled)
+
+        chunks = [chunk for chunk in chunks if chunk is not None]
+        samples = np.concatenate(chunks) if chunks else np.empty((0, len(self.ep)))
+        converged = np.isfinite(samples).all(axis=1)
+        self.nfailed = len(samples) - converged.sum()
+        self.samples = samples[converged]  # (number of successful refits, p)
+        self.n = len(self.samples)
+
+        self.sd_ep = self.samples.std(axis=0, ddof=1) if self.n > 1 else np.full(len(self.ep), np.nan)
+        self.intervals = self.interval(level)
+        with np.errstate(all='ignore'):
+            self.correlation = np.atleast_2d(np.corrcoef(self.samples, rowvar=False)) if self.n > 1 else None
+
+    def interval(self, level: float) -> np.ndarray:
+        """
+        The (p, 2) central percentile intervals of the parameters at the given confidence level.
+        """
+        if self.n == 0:
+            return np.full((len(self.ep), 2), np.nan)
+        tail = (1 - level) / 2 * 100
+        return np.percentile(self.samples, [tail, 100 - tail], axis=0).T
+
+    def __str__(self):
+        str = f'{"Bootstrap" if self.mode == "resample" else "Monte Carlo"}: {self.n} refits'
+        str += f' ({self.nfailed} failed), seed = {self.seed}\n\n'
+        for i, a in enumerate(self.ep):
+            low, high = self.intervals[i]
+            str += f'a[{i}] = {a} +- {self.sd_ep[i]}, {self.level * 100:.2f}% interval [{low}, {high}]\n'
+
+        if self.correlation is not None:
+            str += '\nCorrelation Matrix:\n'
+            for row in self.correlation:
+                str += '  '.join(f'{c:+.3f}' for c in row) + '\n'
+        return str
@@ -0,0 +1,182 @@
+import numpy as np
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+from typing import Hashable, Union
+
+
+def array_size(array: np.ndarray) -> int:
+    """
+    Approximate memory footprint of an array in bytes.
+
+    Object arrays (mixed columns read by pandas) only store pointers, the boxed Python objects are counted as well.
+    """
+    if array.dtype == object:
+        return array.nbytes + array.size * 32
+    return array.nbytes
+
+
+class DataCache:
+    """
+    In-process LRU cache of parsed data arrays.
+
+    The total size of the cached arrays is kept under max_bytes, the least recently used arrays are evicted first.
+    Cached arrays are made read only since the same array is handed to every caller.
+    The cache is shared between the fit worker threads, so every access is guarded by a lock.
+    """
+
+    def __init__(self,
+                 max_bytes: int = 512 * 1024 ** 2
+                 ):
+
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self._arrays = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._arrays)
+
+    def get(self, key: Hashable) -> Union[np.ndarray, None]:
+        with self._lock:
+            if key not in self._arrays:
+                return None
+            self._arrays.move_to_end(key)
+            return self._arrays[key]
+
+    def put(self, key: Hashable, array: np.ndarray) -> None:
+        size = array_size(array)
+        if size > self.max_bytes:  # Caching it would evict everything else
+            return
+        array.flags.writeable = False
+
+        with self._lock:
+            if key in self._arrays:
+                self.nbytes -= array_size(self._arrays.pop(key))
+            self._arrays[key] = array
+            self.nbytes += size
+
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._arrays.popitem(last=False)
+                self.nbytes -= array_size(evicted)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._arrays.clear()
+            self.nbytes = 0
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 ** 2), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class SidecarCache:
+    """
+    Persistent cache of parsed data arrays, stored as .npy files next to the data file.
+
+    Every parsed array is written to '<data dir>/.fitgui_cache/<file name>.<options digest>.npy' alongside a small json
+    file which records the size, modification time and content digest of the source file.
+    A cached array is only used if the source file is unchanged, a file whose modification time changed is hashed again
+    so touching a file does not invalidate its cache.
+    Cached arrays are memory mapped, hence opening a previously seen data file costs almost nothing.
+
+    Every cache directory is kept under max_bytes, the least recently used (written or read) arrays are deleted first.
+    Only numeric arrays are cached since object arrays can not be memory mapped.
+    Failing to write the cache (e.g a read only directory) is not an error, the data is simply parsed next time too.
+    """
+
+    dirname = '.fitgui_cache'
+
+    def __init__(self,
+                 max_bytes: int = 1024 ** 3
+                 ):
+
+        self.max_bytes = max_bytes
+
+    def paths(self, path: str, options: tuple) -> tuple:
+        options_digest = hashlib.blake2b(repr(options).encode(), digest_size=8).hexdigest()
+        directory = os.path.join(os.path.dirname(os.path.abspath(path)), self.dirname)
+        stem = os.path.join(directory, f'{os.path.basename(path)}.{options_digest}')
+        return stem + '.npy', stem + '.json'
+
+    def get(self, path: str, options: tuple) -> Union[np.ndarray, None]:
+        npy_path, meta_path = self.paths(path, options)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            stat = os.stat(path)
+
+            if stat.st_size != meta['size']:
+                return None
+            if stat.st_mtime_ns != meta['mtime_ns']:
+                if file_digest(path) != meta['digest']:
+                    return None
+                meta['mtime_ns'] = stat.st_mtime_ns
+                self._write_meta(meta_path, meta)
+
+            array = np.load(npy_path, mmap_mode='r')
+            try:
+                os.utime(npy_path)  # Recently used, see trim
+            except OSError:
+                pass
+            return array
+
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, path: str, options: tuple, array: np.ndarray) -> None:
+        if array.dtype == object or array.nbytes > self.max_bytes:
+            return
+
+        npy_path, meta_path = self.paths(path, options)
+        try:
+            os.makedirs(os.path.dirname(npy_path), exist_ok=True)
+            stat = os.stat(path)
+            meta = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': file_digest(path)}
+
+            tmp_path = npy_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp_path, npy_path)  # Another process never sees a half written array
+
+            self._write_meta(meta_path, meta)
+            self.trim(os.path.dirname(npy_path))
+
+        except OSError:
+            pass
+
+    def trim(self, directory: str) -> None:
+        """
+        Delete the least recently used arrays of a cache directory, and their json files, until it holds at most max_bytes.
+        """
+        try:
+            # Arrays which are being written are named '<name>.npy.tmp'
+            entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(directory)
+                       if entry.is_file() and entry.name.endswith('.npy')]
+        except FileNotFoundError:
+            return
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, npy_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            for path in (npy_path, npy_path[:-len('.npy')] + '.json'):
+                try:
+                    os.remove(path)
+                except OSError:  # Trimmed by another process, or memory mapped on Windows
+                    pass
+            total -= size
+
+    @staticmethod
+    def _write_meta(meta_path: str, meta: dict) -> None:
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, meta_path)
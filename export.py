@@ -0,0 +1,185 @@
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import matplotlib
+from typing import Callable, List, Tuple
+from jit import cache_dir
+from model_loader import load_model
+from pool import run_pool
+from fit import Fit, plot_font_size
+
+# Rendered figures are cached under this directory, one file per digest of the fit and the style, see figure_key
+figure_cache_dir = os.path.join(cache_dir, 'figures')
+# The least recently used figures are deleted once the cache is larger than this, see trim_figure_cache
+max_figure_cache_bytes = 256 * 1024 ** 2
+
+figure_formats = ('png', 'pdf', 'svg')
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def figure_key(fit: Fit, model_digest: str, kind: str, labels: dict, fmt: str, dpi: float) -> str:
+    """
+    A digest of everything a figure is rendered from: the fitted data, the model script and the parameters
+    (the fit result), the plot, its labels, format and resolution (the style), and the matplotlib version.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(fit.data_fingerprint().encode())
+    h.update(model_digest.encode())
+    h.update(fit.method.encode())
+    h.update(np.ascontiguousarray(fit.ep, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(fit.init_params, dtype=np.float64).tobytes())
+    h.update(json.dumps([kind, labels, fmt, dpi, plot_font_size, matplotlib.__version__], sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def render_figure(fit: Fit, kind: str, labels: dict, fit_num: int, path: str, dpi: float = 100) -> None:
+    """
+    Save the plot of fit which kind names ('fit', 'residuals' or 'initial_guess') to path, see Fit.plot_fit.
+    """
+    if kind == 'fit':
+        fit.plot_fit(labels['title'], labels['xlabel'], labels['ylabel'], fit_num, path=path, dpi=dpi)
+    elif kind == 'residuals':
+        fit.plot_residuals(labels['xlabel'], labels['ylabel'], fit_num, path=path, dpi=dpi)
+    elif kind == 'initial_guess':
+        fit.plot_initial_guess(labels['xlabel'], labels['ylabel'], fit_num, path=path, dpi=dpi)
+    else:
+        raise ValueError(f"Unknown plot '{kind}', the plots are 'fit', 'residuals' and 'initial_guess'")
+
+
+def prepare_figures(fit: Fit, model_path: str, figures: List[dict]) -> List[dict]:
+    """
+    Complete the figures of fit (see export_figures) with their dpi, format and cache key.
+    """
+    model_digest = file_digest(model_path)
+    prepared = []
+    for figure in figures:
+        figure = dict(figure, dpi=figure.get('dpi', 100), format=os.path.splitext(figure['path'])[1][1:].lower())
+        if figure['format'] not in figure_formats:
+            raise ValueError(f"Can not save {figure['path']}, the formats are {', '.join(figure_formats)}")
+        figure['key'] = figure_key(fit, model_digest, figure['kind'], figure['labels'], figure['format'], figure['dpi'])
+        prepared.append(figure)
+    return prepared
+
+
+def cached_path(figure: dict) -> str:
+    return os.path.join(figure_cache_dir, f"{figure['key']}.{figure['format']}")
+
+
+def save_figures(fit: Fit, figures: List[dict], use_cache: bool = True) -> List[str]:
+    """
+    Copy every prepared figure of fit from the cache to its path, the figures which are not cached are rendered.
+
+    A figure is rendered to a file of its own and then renamed into the cache, so a concurrent export never
+    reads half a file. A cached figure may be deleted at any time by trim_figure_cache, it is then rendered again.
+    """
+    os.makedirs(figure_cache_dir, exist_ok=True)
+    for figure in figures:
+        if use_cache:
+            try:
+                os.utime(cached_path(figure))  # Recently used, see trim_figure_cache
+                shutil.copyfile(cached_path(figure), figure['path'])
+                continue
+            except FileNotFoundError:
+                pass
+
+        partial = os.path.join(figure_cache_dir, f"{figure['key']}.{os.getpid()}.{figure['format']}")
+        render_figure(fit, figure['kind'], figure['labels'], figure['fit_num'], partial, figure['dpi'])
+        shutil.copyfile(partial, figure['path'])
+        os.replace(partial, cached_path(figure))
+    return [figure['path'] for figure in figures]
+
+
+def trim_figure_cache(max_bytes: int = max_figure_cache_bytes) -> None:
+    """
+    Delete the least recently used (saved or copied) figures of the cache until it holds at most max_bytes.
+    """
+    try:
+        # Cached figures are named <key>.<format>, the figures which are being rendered have a process id as well
+        entries = [(entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(figure_cache_dir)
+                   if entry.is_file() and entry.name.count('.') == 1]
+    except FileNotFoundError:
+        return
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # Trimmed by another export
+            pass
+        total -= size
+
+
+def render_chunk(fit: Fit, model_path: str, jit: bool, figures: List[dict], use_cache: bool) -> List[str]:
+    """
+    save_figures of a pickled fit.
+    """
+    fit.fitting_func = load_model(model_path, jit).fit_function  # Pickles of Fit do not hold the model
+    return save_figures(fit, figures, use_cache)
+
+
+def export_figures(exports: List[Tuple[Fit, str, List[dict]]],
+                   jit: bool = False,
+                   processes: int = None,
+                   use_cache: bool = True,
+                   callback: Callable[[int, int], None] = None,
+                   is_cancelled: Callable[[], bool] = None
+                   ) -> List[str]:
+    """
+    Save the plots of many fits to image files, rendered by Agg on a process pool.
+
+    Every figure is cached by figure_key, the figures of a fit which were all rendered before (by any export)
+    are only copied, here. The other fits are rendered one fit per task, so its figures share its transfer.
+
+    :param exports: (fit, model path, figures) of every fit. A figure is a dict of kind ('fit', 'residuals' or
+    'initial_guess'), labels (title, xlabel, ylabel), fit_num and path, and optionally dpi (100).
+    The format is the extension of path, one of figure_formats
+    The cache is trimmed to max_figure_cache_bytes once the figures are saved
+    :param jit: compile the models with Numba, see load_model
+    :param processes: number of worker processes, defaults to the number of cores
+    :param use_cache: False renders every figure again
+    :param callback: called with (number of exported fits, number of fits) whenever the figures of a fit are saved
+    :param is_cancelled: checked whenever a fit is done, if it returns True the fits which did not start are dropped
+    :return: the paths of the saved figures
+    """
+    saved = []
+    pending = []
+    for fit, model_path, figures in exports:
+        figures = prepare_figures(fit, model_path, figures)
+        if use_cache and all(os.path.exists(cached_path(figure)) for figure in figures):
+            saved += save_figures(fit, figures)
+        else:
+            pending.append((fit, model_path, figures))
+
+    ndone = len(exports) - len(pending)
+    if callback is not None and ndone:
+        callback(ndone, len(exports))
+    if not pending:
+        trim_figure_cache()
+        return saved
+
+    tasks = [(render_chunk, (fit, model_path, jit, figures, use_cache)) for fit, model_path, figures in pending]
+    results = run_pool(tasks, processes,
+                       callback=None if callback is None else lambda n, _: callback(ndone + n, len(exports)),
+                       is_cancelled=is_cancelled)
+    saved += [path for paths in results if paths is not None for path in paths]
+    trim_figure_cache()
+    return saved
+
+
+def fit_figures(report: dict, directory: str, prefix: str, fmt: str = 'png', dpi: float = 100, fit_num: int = 0) -> List[dict]:
+    """
+    The figures of the plots which a report asks for (see FitGUI.fit), saved as '<directory>/<prefix>_<plot>.<fmt>'.
+    """
+    plots = [('fit', 'Fit', report['plot_fit'], dict(title=report['title'], xlabel=report['xlabel'], ylabel=report['ylabel'])),
+             ('residuals', 'Residuals', report['plot_residuals'], dict(xlabel=report['xlabel'], ylabel=report['residuals_ylabel'])),
+             ('initial_guess', 'Initial Guess', report['plot_initial_guess'], dict(xlabel=report['xlabel'], ylabel=report['ylabel']))]
+    return [dict(kind=kind, labels=labels, fit_num=fit_num, dpi=dpi, path=os.path.join(directory, f'{prefix}_{name}.{fmt}'))
+            for kind, name, enabled, labels in plots if enabled]
@@ -1,10 +1,111 @@
 import numpy as np
+import hashlib
 from scipy.odr import ODR, Model, RealData
 from typing import List, Union
 from scipy.stats import chi2
 from scipy.optimize import curve_fit
+from scipy.optimize import least_squares
+from scipy.linalg import solve_triangular
 import matplotlib.pyplot as plt
 from matplotlib.ticker import AutoMinorLocator
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from model_loader import load_model
+from pool import run_pool
+from render import DecimatedErrorbar, adaptive_samples, decimation_threshold, plot_pixels, update_errorbar
+
+# Font size of the plots, which are 15x12 inch figures
+plot_font_size = 30
+
+# Number of random parameter vectors at which linear_design verifies a model declared linear
+linearity_checks = 3
+
+
+def evaluate_model(func, method: str, params: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    The (k, n) values of func at x for every row of the (k, p) params, in a single broadcast call when func allows it.
+    """
+    params = np.atleast_2d(params)
+    try:
+        with np.errstate(all='ignore'):
+            if method == 'odr':
+                values = func(params.T[:, :, np.newaxis], x[np.newaxis, :])
+            else:
+                values = func(x[np.newaxis, :], *params.T[:, :, np.newaxis])
+            return np.broadcast_to(values, (len(params), len(x)))
+    except (TypeError, ValueError, IndexError):  # func does not broadcast, evaluate it one parameters vector at a time
+        with np.errstate(all='ignore'):
+            if method == 'odr':
+                return np.array([np.broadcast_to(func(p, x), x.shape) for p in params])
+            return np.array([np.broadcast_to(func(x, *p), x.shape) for p in params])
+
+
+def weighted_residuals(func,
+                       method: str,
+                       params: np.ndarray,
+                       x: np.ndarray,
+                       dx: Union[np.ndarray, None],
+                       y: np.ndarray,
+                       dy: Union[np.ndarray, None]
+                       ) -> np.ndarray:
+    """
+    The (k, n) residuals divided by the errors, whose squares sum to the chi squared of every row of params.
+
+    ODR's chi squared also depends on the fitted x errors, which are only known by fitting.
+    They are accounted for by the effective variance dy^2 + (d func/dx * dx)^2 instead,
+    which is exact for straight lines and close to ODR's chi squared whenever dx is small.
+    """
+    values = evaluate_model(func, method, params, x)
+    variance = 1 if dy is None else dy ** 2
+    if method == 'odr' and dx is not None:
+        step = 1e-6 * np.maximum(np.abs(x), 1)
+        slope = (evaluate_model(func, method, params, x + step) - evaluate_model(func, method, params, x - step)) / (2 * step)
+        variance = variance + (slope * dx) ** 2
+    return (y - values) / np.sqrt(variance)
+
+
+def profile_points(func,
+                   method: str,
+                   data: tuple,
+                   indices: List[int],
+                   points: np.ndarray,
+                   start: np.ndarray
+                   ) -> tuple:
+    """
+    Minimize the chi squared over the parameters which are not in indices, with those in indices fixed at each point.
+
+    Every minimization starts from the solution of the previous point, consecutive points should be neighbours.
+    :param data: the (x, dx, y, dy) of the fitted points
+    :return: the (k,) minimal chi squared and the (k, p) parameters of every point
+    """
+    free = np.setdiff1d(np.arange(len(start)), indices)
+    params = np.array(start, dtype=np.float64)
+    chi2 = np.empty(len(points))
+    solutions = np.empty((len(points), len(params)))
+
+    def residuals(free_params):
+        params[free] = free_params
+        return weighted_residuals(func, method, params, *data)[0]
+
+    for k, point in enumerate(points):
+        params[indices] = point
+        if len(free):
+            try:
+                params[free] = least_squares(residuals, params[free].copy(), method='lm').x
+            except ValueError:  # Fewer points than free parameters, or non finite residuals
+                params[free] = start[free]
+        solutions[k] = params
+        r = weighted_residuals(func, method, params, *data)[0]
+        chi2[k] = r @ r
+    return chi2, solutions
+
+
+def profile_chunk(model_path: str, jit: bool, method: str, data: tuple, indices: List[int], points: np.ndarray,
+                  start: np.ndarray) -> tuple:
+    """
+    profile_points with the model imported from model_path.
+    """
+    return profile_points(load_model(model_path, jit).fit_function, method, data, indices, points, start)
 
 
 class Fit:
@@ -15,24 +116,39 @@ class Fit:
                  p0: Union[List[float], np.ndarray],
                  func,
                  x_range: Union[List[float], None],
-                 method: str = 'odr'):
+                 method: str = 'odr',
+                 jacobian=None,
+                 fjacb=None,
+                 fjacd=None,
+                 warm_start: Union[dict, None] = None,
+                 linear: Union[bool, None] = None):
 
         """
         :param colorder: [x_col, dx_col, y_col, dy_col]
+        :param jacobian: Least Squares only, jacobian(x, *params) -> (n, p) array of d func/d params.
+        :param fjacb: ODR only, fjacb(params, x) -> (p, n) array of d func/d params.
+        :param fjacd: ODR only, fjacd(params, x) -> (n,) array of d func/d x.
+        Without them the solvers estimate the derivatives by finite differences.
+        ODR needs both fjacb and fjacd since it also fits the x errors.
+        :param warm_start: the warm_state() of a previous fit of the same model, the solver starts from its solution
+        instead of p0. If the fitted data is unchanged ODR continues the previous run (scipy.odr restart),
+        if only the number of points is unchanged ODR also starts from the previous x errors (delta).
+        A warm state of a different number of parameters than p0 (e.g of an older version of the model) is ignored.
+        :param linear: Least Squares only, whether func is linear in its parameters (e.g a polynomial).
+        Such models are solved directly by a weighted linear least squares (QR) instead of iteratively by curve_fit,
+        with the same results, if the decomposition holds when func is evaluated (see linear_design).
+        None and False always use curve_fit.
         """
-        plt.rcParams['font.size'] = 30
-
         self.npoints = data.shape[0]
         self.ncols = data.shape[1]
 
-        self.x = data[:, colorder[0]].astype(np.float)
-        self.xfit = np.linspace(self.x.min(), self.x.max(), 1000)
-        self.y = data[:, colorder[2]].astype(np.float)
+        self.x = np.asarray(data[:, colorder[0]], dtype=np.float64)  # No copy if data is already float64
+        self.y = np.asarray(data[:, colorder[2]], dtype=np.float64)
 
         if colorder[3] is None:
             self.dy = None
         else:
-            self.dy = data[:, colorder[3]].astype(np.float)
+            self.dy = np.asarray(data[:, colorder[3]], dtype=np.float64)
 
         self.condition = None
         if x_range is not None:
@@ -41,16 +157,31 @@ class Fit:
             if low_bound >= high_bound:
                 raise ValueError("low <= high. First is low and second is high")
             self.condition = (low_bound <= self.x) & (self.x <= high_bound)
-            self.condition_xfit = (self.x[self.condition].min() <= self.xfit) & (self.xfit <= self.x[self.condition].max())
 
         self.fitting_func = func
+        self.jacobian = jacobian
+        if (fjacb is None) != (fjacd is None):
+            raise ValueError("ODR requires both fjacb and fjacd, or neither of them")
+        self.fjacb = fjacb
+        self.fjacd = fjacd
 
         self.init_params = p0
         self.method = method
 
+        self.linear = linear
+        self.is_linear = False
+
+        if warm_start is not None and len(warm_start['ep']) != len(p0):
+            warm_start = None
+        self.warm_started = warm_start is not None
+        self.start_params = p0 if warm_start is None else warm_start['ep']
+        self.fingerprint = None
+        self.multi_start = None  # The MultiStart which found this fit, if any
+        self.curves = {}  # (parameters, pixels) -> x, y of the curve, see curve
+
 
-        if self.ncols >= 4 and self.method == 'odr':  # ODR
-            self.dx = data[:, colorder[1]].astype(np.float)
+        if colorder[1] is not None and self.method == 'odr':  # ODR
+            self.dx = np.asarray(data[:, colorder[1]], dtype=np.float64)
 
             if self.condition is not None:
                 if self.dy is not None:
@@ -61,9 +192,19 @@ class Fit:
             else:
                 self.data = RealData(self.x, self.y, self.dx, self.dy)  # Inserting data to a form which ODR class accepts
 
-            self.model = Model(self.fitting_func)  # Inserting the fitting function to a form which ODR class accepts
+            self.model = Model(self.fitting_func, fjacb=self.fjacb, fjacd=self.fjacd)  # Inserting the fitting function to a form which ODR class accepts
 
-            self.odr = ODR(self.data, self.model, self.init_params)  # Creating the ODR instance with initial guesses for the parameters
+            previous_output = None if warm_start is None else warm_start['output']
+            if previous_output is not None and warm_start['fingerprint'] == self.data_fingerprint():
+                # Continue the previous run, its work arrays hold the state of the solver
+                self.odr = ODR(self.data, self.model, self.start_params, work=previous_output.work, iwork=previous_output.iwork)
+                self.odr.set_job(restart=1)
+            elif previous_output is not None and previous_output.delta.shape == self.data.x.shape:
+                self.odr = ODR(self.data, self.model, self.start_params, delta0=previous_output.delta)
+            else:
+                self.odr = ODR(self.data, self.model, self.start_params)  # Creating the ODR instance with initial guesses for the parameters
+            if self.fjacb is not None:
+                self.odr.set_job(deriv=3)  # User supplied derivatives. ODRPACK's own check (deriv=2) costs more than the whole fit
 
             self.output = self.odr.run()  # Fit calculations
 
@@ -71,27 +212,27 @@ class Fit:
 
             self.sd_ep = self.output.sd_beta  # List of standard deviation of estimated fitting parameters
 
-            if self.condition is not None:
-                self.yfit = self.fitting_func(self.ep, self.xfit[self.condition_xfit])  # Fitting function with estimated fitting params
-            else:
-                self.yfit = self.fitting_func(self.ep, self.xfit)  # Fitting function with estimated fitting params
-
             self.chi2 = self.output.sum_square
 
         elif self.method == 'ls':  # Least Squares
-            if self.condition is not None:
+            xm, _, ym, dym = self.fitted_data()
+            design = self.linear_design(xm) if self.linear else None
+            if design is not None:
+                self.is_linear = True
+                self.ep, self.cov_ep = self.linear_solve(*design, ym, dym)  # Estimated fitting params and their covariance matrix
+
+            elif self.condition is not None:
                 if self.dy is not None:
-                    self.ep, self.cov_ep = curve_fit(self.fitting_func, self.x[self.condition], self.y[self.condition], p0=self.init_params, sigma=self.dy[self.condition])  # Estimated fitting params and their covariance matrix
+                    self.ep, self.cov_ep = curve_fit(self.fitting_func, self.x[self.condition], self.y[self.condition], p0=self.start_params, sigma=self.dy[self.condition], jac=self.jacobian)  # Estimated fitting params and their covariance matrix
                 else:
-                    self.ep, self.cov_ep = curve_fit(self.fitting_func, self.x[self.condition], self.y[self.condition], p0=self.init_params, sigma=self.dy)  # Estimated fitting params and their covariance matrix
+                    self.ep, self.cov_ep = curve_fit(self.fitting_func, self.x[self.condition], self.y[self.condition], p0=self.start_params, sigma=self.dy, jac=self.jacobian)  # Estimated fitting params and their covariance matrix
 
             else:
-                self.ep, self.cov_ep = curve_fit(self.fitting_func, self.x, self.y, p0=self.init_params, sigma=self.dy)  # Estimated fitting params and their covariance matrix
+                self.ep, self.cov_ep = curve_fit(self.fitting_func, self.x, self.y, p0=self.start_params, sigma=self.dy, jac=self.jacobian)  # Estimated fitting params and their covariance matrix
 
             self.sd_ep = np.sqrt(np.diag(self.cov_ep))  # List of standard deviation of estimated fitting parameters
 
             if self.condition is not None:
-                self.yfit = self.fitting_func(self.xfit[self.condition_xfit], *self.ep)  # Fitting function with estimated fitting params
                 self.yfit_yshape = self.fitting_func(self.x[self.condition], *self.ep)  # Fitting function with estimated fitting params
 
                 if self.dy is None:
@@ -100,7 +241,6 @@ class Fit:
                     self.chi2 = np.sum(((self.yfit_yshape - self.y[self.condition]) / self.dy[self.condition]) ** 2)
 
             else:
-                self.yfit = self.fitting_func(self.xfit, *self.ep)  # Fitting function with estimated fitting params
                 self.yfit_yshape = self.fitting_func(self.x, *self.ep)  # Fitting function with estimated fitting params
 
                 if self.dy is None:
@@ -116,6 +256,164 @@ class Fit:
         self.pvalue = chi2.sf(self.chi2, self.dof)
         self.chi2red = self.chi2/self.dof
 
+    def __getstate__(self) -> dict:
+        """
+        The model functions are left out of pickles, a worker process imports them again by path (see export).
+        """
+        state = self.__dict__.copy()
+        for name in ('fitting_func', 'jacobian', 'fjacb', 'fjacd', 'model', 'odr'):
+            state[name] = None
+        return state
+
+    def linear_design(self, x: np.ndarray) -> Union[tuple, None]:
+        """
+        If func(x, *params) = offset(x) + design(x) @ params, return (offset, design), otherwise None.
+
+        The columns of the design matrix are the changes of func when one parameter is changed.
+        A model declared linear may still not be (e.g abs(a)), so the superposition is verified at several
+        random parameter vectors, each on a random subset of the points. Any error of func also returns None,
+        the fit then falls back to curve_fit.
+        """
+        p = np.asarray(self.start_params, dtype=np.float64)
+        steps = np.maximum(np.abs(p), 1)
+        rng = np.random.default_rng(0)  # Fixed, so the same fit is always solved the same way
+
+        try:
+            with np.errstate(all='ignore'):
+                f0 = np.broadcast_to(self.fitting_func(x, *p), x.shape)
+                design = np.column_stack([np.broadcast_to(self.fitting_func(x, *(p + step)) - f0, x.shape) / steps[i]
+                                          for i, step in enumerate(np.diag(steps))])
+                offset = f0 - design @ p
+                if not (np.isfinite(design).all() and np.isfinite(offset).all()):
+                    return None
+
+                for _ in range(linearity_checks):
+                    q = p + steps * rng.uniform(-10, 10, len(p))
+                    points = np.sort(rng.choice(len(x), min(len(x), 1000), replace=False))
+                    fq = np.broadcast_to(self.fitting_func(x[points], *q), points.shape)
+                    expected = offset[points] + design[points] @ q
+                    scale = np.abs(f0).max(initial=0) + np.abs(design).max(initial=0) * np.abs(q).max()
+                    if not np.allclose(fq, expected, rtol=1e-9, atol=1e-9 * scale):
+                        return None
+        except Exception:
+            return None
+        return offset, design
+
+    def linear_solve(self,
+                     offset: np.ndarray,
+                     design: np.ndarray,
+                     y: np.ndarray,
+                     dy: Union[np.ndarray, None]
+                     ) -> tuple:
+        """
+        Weighted linear least squares by a QR decomposition of the design matrix.
+
+        The covariance matrix is scaled by the reduced chi squared, as curve_fit does (absolute_sigma=False).
+        """
+        weights = 1 if dy is None else 1 / dy
+        q, r = np.linalg.qr(design * np.reshape(weights, (-1, 1)))
+        ep = solve_triangular(r, q.T @ ((y - offset) * weights))
+
+        r_inv = solve_triangular(r, np.eye(len(ep)))
+        residuals = (y - offset - design @ ep) * weights
+        dof = len(y) - len(ep)
+        scale = residuals @ residuals / dof if dof > 0 else np.inf
+        return ep, r_inv @ r_inv.T * scale
+
+    def fitted_data(self) -> tuple:
+        """
+        x, dx, y, dy of the points inside the x range, dx and dy are None if they are not used.
+        """
+        dx = getattr(self, 'dx', None)
+        if self.condition is None:
+            return self.x, dx, self.y, self.dy
+        return tuple(None if a is None else a[self.condition] for a in (self.x, dx, self.y, self.dy))
+
+    def chi2_values(self, params: np.ndarray, chunk_bytes: int = 32 * 1024 ** 2) -> np.ndarray:
+        """
+        The (k,) chi squared of the fitted points at every row of the (k, p) params, see weighted_residuals.
+
+        The rows are evaluated together in chunks of about chunk_bytes of residuals.
+        """
+        params = np.atleast_2d(np.asarray(params, dtype=np.float64))
+        data = self.fitted_data()
+        chunksize = max(1, chunk_bytes // (8 * len(data[0])))
+
+        chi2 = np.empty(len(params))
+        for start in range(0, len(params), chunksize):
+            r = weighted_residuals(self.fitting_func, self.method, params[start:start + chunksize], *data)
+            chi2[start:start + chunksize] = np.einsum('kn,kn->k', r, r)
+        return chi2
+
+    def scan_values(self, index: int, nsd: float = 3, npoints: int = 41) -> np.ndarray:
+        """
+        npoints values of parameter index, nsd standard deviations around its estimate.
+        """
+        return np.linspace(self.ep[index] - nsd * self.sd_ep[index], self.ep[index] + nsd * self.sd_ep[index], npoints)
+
+    def scan(self,
+             indices: List[int],
+             values: List[np.ndarray],
+             profile: bool = False,
+             model_path: Union[str, None] = None,
+             jit: bool = False,
+             processes: int = None
+             ) -> np.ndarray:
+        """
+        The chi squared over a grid of 1 or 2 parameters.
+
+        The other parameters are fixed at their estimates, or with profile=True minimized at every grid point
+        (the profile likelihood). Without profile the whole grid is evaluated in vectorized chunks.
+        chi2 - self.chi2 = 1 is the 68% interval of 1 parameter and 2.30 the 68% contour of 2 parameters.
+
+        :param indices: the scanned parameters, e.g [0] or [0, 2]
+        :param values: the values of each scanned parameter, e.g [fit.scan_values(0), fit.scan_values(2)]
+        :param model_path: the script of func, with it the profile is computed on a process pool, one grid row per task
+        :param processes: number of worker processes, defaults to the number of cores
+        :return: the chi squared, of shape (len(values[0]),) or (len(values[0]), len(values[1]))
+        """
+        if len(indices) != len(values) or len(indices) not in (1, 2):
+            raise ValueError('Scan 1 or 2 parameters, with the values of each of them')
+
+        grid = np.stack(np.meshgrid(*values, indexing='ij'), axis=-1)  # (*shape, len(indices))
+        shape = grid.shape[:-1]
+
+        if not profile:
+            params = np.tile(np.asarray(self.ep, dtype=np.float64), (grid[..., 0].size, 1))
+            params[:, indices] = grid.reshape(-1, len(indices))
+            return self.chi2_values(params).reshape(shape)
+
+        rows = grid.reshape(shape[0], -1, len(indices))  # A 1-D scan is a single row
+        if len(indices) == 1:
+            rows = rows.reshape(1, -1, 1)
+
+        data = self.fitted_data()
+        if model_path is None:
+            chi2 = [profile_points(self.fitting_func, self.method, data, indices, row, self.ep)[0] for row in rows]
+        else:
+            tasks = [(profile_chunk, (model_path, jit, self.method, data, indices, row, self.ep)) for row in rows]
+            chi2 = [chi2 for chi2, _ in run_pool(tasks, processes)]
+        return np.reshape(chi2, shape)
+
+    def data_fingerprint(self) -> str:
+        """
+        A digest of the fitted data, to tell whether two fits were fitted to exactly the same points.
+        """
+        if self.fingerprint is None:
+            h = hashlib.blake2b(digest_size=16)
+            for a in self.fitted_data():
+                h.update(b'None' if a is None else np.ascontiguousarray(a).tobytes())
+            self.fingerprint = h.hexdigest()
+        return self.fingerprint
+
+    def warm_state(self) -> dict:
+        """
+        What a later fit of the same model needs in order to start from this fit's solution, see warm_start.
+        """
+        return {'ep': self.ep.copy(),
+                'output': getattr(self, 'output', None),
+                'fingerprint': self.data_fingerprint()}
+
     def __str__(self):
         str = ''
         for i, a in enumerate(self.ep):
@@ -125,131 +423,240 @@ class Fit:
         str += f'chi squared = {self.chi2:.2f}\n'
         str += f'pvalue = {self.pvalue:.2f}\n'
         str += f'chi squared reduced = {self.chi2red:.2f}\n'
-        str += f'\nInitial Parameters = {self.init_params}\n\n\n'
+        str += f'\nInitial Parameters = {self.init_params}\n'
+        if self.warm_started:
+            str += f'Warm Started From = {np.asarray(self.start_params).tolist()}\n'
+        if self.multi_start is not None:
+            str += '\n' + self.multi_start.__str__()
+        str += '\n\n'
         str += 'LaTeX form:\n\n'
         for i, a in enumerate(self.ep):
             str += fr'a_{i} = {a} \pm {self.sd_ep[i]}\ ({abs(self.sd_ep[i]*100/a):.2f}\%\ ' + r'\text{Rel. Error})\\' + '\n'
 
         return str
 
-    def plot_fit(self,
-                 title: str,
-                 xlabel: str,
-                 ylabel:str,
-                 fit_num: int
-                 ):
-
-        fig, ax = plt.subplots(figsize=(15, 12), num=f'Fit {fit_num}_fit')
+    def curve(self, params: np.ndarray, pixels: int = 1000) -> tuple:
+        """
+        x, y of the model at params over the fitted x range, sampled adaptively for a plot pixels wide.
 
-        if self.method == 'odr':
-            if self.condition is not None:
-                if self.dy is not None:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy[self.condition], xerr=self.dx[self.condition], ls='None', capsize=10, elinewidth=3, fmt='.', ms=30, capthick=3, label='Data')
-                else:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy, xerr=self.dx[self.condition], ls='None', capsize=10, elinewidth=3, fmt='.', ms=30, capthick=3, label='Data')
-            else:
-                ax.errorbar(self.x, self.y, yerr=self.dy, xerr=self.dx, ls='None', capsize=10, elinewidth=3, fmt='.', ms=30, capthick=3, label='Data')
+        The curves are only computed when a plot asks for them, and are kept for later plots of the same size.
+        x is sampled in log scale if it is positive and spans 2 decades or more, see adaptive_samples.
+        """
+        params = np.asarray(params, dtype=np.float64)
+        key = (params.tobytes(), pixels)
+        if key not in self.curves:
+            x = self.fitted_data()[0]
+            low, high = x.min(), x.max()
+            self.curves[key] = adaptive_samples(lambda xs: evaluate_model(self.fitting_func, self.method, params, xs)[0],
+                                                low, high, pixels, log=low > 0 and high >= 100 * low)
+        return self.curves[key]
+
+    @property
+    def xfit(self) -> np.ndarray:
+        return self.fit_curve()[0]
+
+    @property
+    def yfit(self) -> np.ndarray:
+        return self.fit_curve()[1]
+
+    def fit_curve(self, pixels: int = 1000) -> tuple:
+        """
+        x, y of the fitted curve, over the fitted x range.
+        """
+        return self.curve(self.ep, pixels)
 
-        elif self.method == 'ls':
-            if self.condition is not None:
-                if self.dy is not None:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy[self.condition], ls='None', capsize=10, elinewidth=3, fmt='.', ms=30, capthick=3, label='Data')
-                else:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy, ls='None', capsize=10, elinewidth=3, fmt='.', ms=30, capthick=3, label='Data')
+    def initial_guess_curve(self, pixels: int = 1000) -> tuple:
+        """
+        x, y of the curve of the initial parameters, over the fitted x range.
+        """
+        return self.curve(self.init_params, pixels)
 
-            else:
-                ax.errorbar(self.x, self.y, yerr=self.dy, ls='None', capsize=10, elinewidth=3, fmt='.', ms=30, capthick=3, label='Data')
+    def residuals(self) -> np.ndarray:
+        """
+        y - the model at every fitted point.
+        """
+        x, _, y, _ = self.fitted_data()
+        return y - evaluate_model(self.fitting_func, self.method, self.ep, x)[0]
 
-        if self.condition is not None:
-            ax.plot(self.xfit[self.condition_xfit], self.yfit, lw=5, label='Fit')
-        else:
-            ax.plot(self.xfit, self.yfit, lw=5, label='Fit')
-        ax.set(title=fr'${title}$', xlabel=fr'${xlabel}$', ylabel=fr'${ylabel}$')
-        ax.xaxis.set_minor_locator(AutoMinorLocator())
-        ax.yaxis.set_minor_locator(AutoMinorLocator())
-        ax.grid()
-        ax.legend(loc='best')
-        plt.tight_layout()
+    def plot_data(self, ax, x, y, dx, dy, **style):
+        """
+        ax.errorbar of the data, or a DecimatedErrorbar if there are more than decimation_threshold points.
+        """
+        if len(x) > decimation_threshold:
+            return DecimatedErrorbar(ax, x, y, dx, dy, label=style.get('label'))
+        return ax.errorbar(x, y, yerr=dy, xerr=dx, **style)
 
+    @staticmethod
+    def new_axes(num: str, path: Union[str, None] = None, dpi: float = 100):
+        """
+        The axes of a new 15x12 inch figure: a pyplot window, or an Agg figure which pyplot does not know of if it is
+        only saved to path.
+        """
+        if path is None:
+            return plt.subplots(figsize=(15, 12), num=num)[1]
+        figure = Figure(figsize=(15, 12), dpi=dpi)
+        FigureCanvasAgg(figure)
+        return figure.add_subplot()
 
-    def plot_residuals(self,
+    def plot_fit(self,
+                 title: str,
                  xlabel: str,
-                 ylabel: str,
-                 fit_num: int
-                 ):
-
-        fig, ax = plt.subplots(figsize=(15, 12), num=f'Fit {fit_num}_Residuals')
+                 ylabel:str,
+                 fit_num: int,
+                 ax=None,
+                 scale: float = 1,
+                 path: str = None,
+                 dpi: float = 100
+                 ) -> dict:
+        """
+        Plot the data and the fitted curve on a new pyplot figure, or on ax.
 
-        if self.method == 'odr':
-            if self.condition is not None:
-                if self.dy is not None:
-                    ax.errorbar(self.x[self.condition], self.y - self.yfit, yerr=self.dy[self.condition], xerr=self.dx[self.condition], ls='None', elinewidth=3, capsize=10, fmt='.', ms=30, capthick=3)
-                else:
-                    ax.errorbar(self.x[self.condition], self.y - self.yfit, yerr=self.dy, xerr=self.dx[self.condition], ls='None', elinewidth=3, capsize=10, fmt='.', ms=30, capthick=3)
-            else:
-                ax.errorbar(self.x, self.y - self.yfit, yerr=self.dy, xerr=self.dx, ls='None', elinewidth=3, capsize=10, fmt='.', ms=30, capthick=3)
+        :param scale: of the markers and lines, which are sized for a 15x12 inch figure
+        :param path: save the figure to this file (png, pdf, svg... by its extension) instead of showing it,
+        a new figure is then rendered by Agg outside of pyplot, so this also works without a display
+        :param dpi: resolution of the saved figure
+        :return: the artists, which update_plot updates in place
+        """
+        with plt.rc_context({'font.size': plot_font_size} if ax is None else {}):
+            if ax is None:
+                ax = self.new_axes(f'Fit {fit_num}_fit', path, dpi)
+
+            x, dx, y, dy = self.fitted_data()
+            artists = dict(data=self.plot_data(ax, x, y, dx, dy, ls='None', capsize=10 * scale, elinewidth=3 * scale,
+                                               fmt='.', ms=30 * scale, capthick=3 * scale, label='Data'),
+                           curve=ax.plot(*self.fit_curve(plot_pixels(ax)), lw=5 * scale, label='Fit')[0])
+
+            ax.set(title=fr'${title}$', xlabel=fr'${xlabel}$', ylabel=fr'${ylabel}$')
+            ax.xaxis.set_minor_locator(AutoMinorLocator())
+            ax.yaxis.set_minor_locator(AutoMinorLocator())
+            ax.grid()
+            ax.legend(loc='best')
+            ax.figure.tight_layout()
+            if path is not None:
+                ax.figure.savefig(path, dpi=dpi)
+        return artists
 
 
-        elif self.method == 'ls':
-            if self.condition is not None:
-                if self.dy is not None:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition] - self.yfit, yerr=self.dy[self.condition], ls='None', elinewidth=3, capsize=10, fmt='.', ms=30, capthick=3)
-                else:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition] - self.yfit, yerr=self.dy, ls='None', elinewidth=3, capsize=10, fmt='.', ms=30, capthick=3)
-                ax.hlines(0, min(self.x[self.condition]), max(self.x[self.condition]), colors='r', lw=4, ls='dashed')
+    def plot_residuals(self,
+                 xlabel: str,
+                 ylabel: str,
+                 fit_num: int,
+                 ax=None,
+                 scale: float = 1,
+                 path: str = None,
+                 dpi: float = 100
+                 ) -> dict:
+        """
+        Plot the residuals at the data points on a new pyplot figure, or on ax, see plot_fit.
+        """
+        with plt.rc_context({'font.size': plot_font_size} if ax is None else {}):
+            if ax is None:
+                ax = self.new_axes(f'Fit {fit_num}_Residuals', path, dpi)
 
-            else:
-                ax.errorbar(self.x, self.y - self.yfit, yerr=self.dy, ls='None', elinewidth=3, capsize=10, fmt='.', ms=30, capthick=3)
-                ax.hlines(0, min(self.x), max(self.x), colors='r', lw=4, ls='dashed')
+            x, dx, _, dy = self.fitted_data()
+            artists = dict(data=self.plot_data(ax, x, self.residuals(), dx, dy, ls='None', elinewidth=3 * scale,
+                                               capsize=10 * scale, fmt='.', ms=30 * scale, capthick=3 * scale),
+                           zero=ax.hlines(0, min(x), max(x), colors='r', lw=4 * scale, ls='dashed'))
 
-        ax.set(title=r'$Residuals$', xlabel=fr'${xlabel}$', ylabel=fr'${ylabel}$')
-        ax.xaxis.set_minor_locator(AutoMinorLocator())
-        ax.yaxis.set_minor_locator(AutoMinorLocator())
-        ax.grid()
-        plt.tight_layout()
+            ax.set(title=r'$Residuals$', xlabel=fr'${xlabel}$', ylabel=fr'${ylabel}$')
+            ax.xaxis.set_minor_locator(AutoMinorLocator())
+            ax.yaxis.set_minor_locator(AutoMinorLocator())
+            ax.grid()
+            ax.figure.tight_layout()
+            if path is not None:
+                ax.figure.savefig(path, dpi=dpi)
+        return artists
 
 
     def plot_initial_guess(self,
                  xlabel: str,
                  ylabel: str,
-                 fit_num: int
-                 ):
-
-        fig, ax = plt.subplots(figsize=(15, 12), num=f'Fit {fit_num}_Initial Guess')
-
-        if self.method == 'odr':
-            if self.condition is not None:
-                if self.dy is not None:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy[self.condition], xerr=self.dx[self.condition], ls='None', capsize=2, elinewidth=1, fmt='.', ms=30, label='Data')
-                    ax.plot(self.xfit[self.condition_xfit], self.fitting_func(self.init_params, self.xfit[self.condition_xfit]), lw=1, label='Initial Guess')
-                else:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy,
-                                xerr=self.dx[self.condition], ls='None', capsize=2, elinewidth=1, fmt='.', ms=30,
-                                label='Data')
-                    ax.plot(self.xfit[self.condition_xfit], self.fitting_func(self.init_params, self.xfit[self.condition_xfit]), lw=1,
-                            label='Initial Guess')
-            else:
-                ax.errorbar(self.x, self.y, yerr=self.dy, xerr=self.dx, ls='None', capsize=2, elinewidth=1, fmt='.', ms=30, label='Data')
-                ax.plot(self.xfit, self.fitting_func(self.init_params, self.xfit), lw=1, label='Initial Guess')
+                 fit_num: int,
+                 ax=None,
+                 scale: float = 1,
+                 path: str = None,
+                 dpi: float = 100
+                 ) -> dict:
+        """
+        Plot the data and the curve of the initial parameters on a new pyplot figure, or on ax, see plot_fit.
+        """
+        with plt.rc_context({'font.size': plot_font_size} if ax is None else {}):
+            if ax is None:
+                ax = self.new_axes(f'Fit {fit_num}_Initial Guess', path, dpi)
+
+            x, dx, y, dy = self.fitted_data()
+            artists = dict(data=self.plot_data(ax, x, y, dx, dy, ls='None', capsize=2 * scale, elinewidth=1 * scale,
+                                               fmt='.', ms=30 * scale, label='Data'),
+                           curve=ax.plot(*self.initial_guess_curve(plot_pixels(ax)), lw=(1 if self.method == 'odr' else 5) * scale,
+                                         label='Initial Guess')[0])
+
+            ax.set(title=r'$Initial\ Guess$', xlabel=fr'${xlabel}$', ylabel=fr'${ylabel}$')
+            ax.xaxis.set_minor_locator(AutoMinorLocator())
+            ax.yaxis.set_minor_locator(AutoMinorLocator())
+            ax.grid()
+            ax.legend(loc='best')
+            ax.figure.tight_layout()
+            if path is not None:
+                ax.figure.savefig(path, dpi=dpi)
+        return artists
+
+    def update_plot(self, kind: str, artists: dict, ax, labels: dict) -> bool:
+        """
+        Show this fit on a plot which another fit drew, by updating its artists in place.
 
-        elif self.method == 'ls':
-            if self.condition is not None:
-                if self.dy is not None:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy[self.condition], ls='None', capsize=2, elinewidth=1, fmt='.', ms=30, label='Data')
-                    ax.plot(self.xfit[self.condition_xfit], self.fitting_func(self.xfit[self.condition_xfit], *self.init_params), lw=5, label='Initial Guess')
-                else:
-                    ax.errorbar(self.x[self.condition], self.y[self.condition], yerr=self.dy, ls='None',
-                                capsize=2, elinewidth=1, fmt='.', ms=30, label='Data')
-                    ax.plot(self.xfit[self.condition_xfit], self.fitting_func(self.xfit[self.condition_xfit], *self.init_params), lw=5,
-                            label='Initial Guess')
+        :param kind: 'fit', 'residuals' or 'initial_guess', the plot method which drew the artists
+        :param labels: the title, xlabel and ylabel of the plot, a plot without a title ignores it
+        :return: False if the artists can not show this fit (e.g the other fit had no dx), the plot must be drawn anew
+        """
+        x, dx, y, dy = self.fitted_data()
+        if kind == 'residuals':
+            y = self.residuals()
+        if not update_errorbar(artists['data'], x, y, dx, dy, decimated=len(x) > decimation_threshold):
+            return False
+
+        if kind == 'fit':
+            artists['curve'].set_data(*self.fit_curve(plot_pixels(ax)))
+        elif kind == 'initial_guess':
+            artists['curve'].set_data(*self.initial_guess_curve(plot_pixels(ax)))
+        else:
+            artists['zero'].set_segments([[(min(x), 0), (max(x), 0)]])
+
+        ax.set(xlabel=fr"${labels['xlabel']}$", ylabel=fr"${labels['ylabel']}$")
+        if kind == 'fit':
+            ax.set_title(fr"${labels['title']}$")
+        ax.relim()
+        if isinstance(artists['data'], DecimatedErrorbar):
+            artists['data'].update_datalim()
+        ax.autoscale_view()
+        return True
+
+    def plot_scan(self,
+                  indices: List[int],
+                  values: List[np.ndarray],
+                  chi2: np.ndarray,
+                  fit_num: int
+                  ):
+        """
+        Plot the chi squared of scan relative to the best fit, as a curve (1 parameter) or 1, 2, 3 sigma contours (2).
+        """
+        delta = chi2 - chi2.min()
+        names = [fr'$a_{i}$' for i in indices]
+
+        with plt.rc_context({'font.size': plot_font_size}):
+            fig, ax = plt.subplots(figsize=(15, 12), num=f'Fit {fit_num}_Scan {indices}')
+            if len(indices) == 1:
+                ax.plot(values[0], delta, lw=5)
+                ax.axhline(1, color='r', lw=3, ls='dashed', label=r'$\Delta\chi^2=1$')
+                ax.set(title=r'$\chi^2\ Scan$', xlabel=names[0], ylabel=r'$\chi^2-\chi^2_{min}$')
+                ax.legend(loc='best')
             else:
-                ax.errorbar(self.x, self.y, yerr=self.dy, ls='None',capsize=2, elinewidth=1, fmt='.', ms=30, label='Data')
-                ax.plot(self.xfit, self.fitting_func(self.xfit, *self.init_params), lw=5, label='Initial Guess')
-
-        ax.set(title=r'$Initial\ Guess$', xlabel=fr'${xlabel}$', ylabel=fr'${ylabel}$')
-        ax.xaxis.set_minor_locator(AutoMinorLocator())
-        ax.yaxis.set_minor_locator(AutoMinorLocator())
-        ax.grid()
-        ax.legend(loc='best')
-        plt.tight_layout()
-
+                levels = [2.30, 6.18, 11.83]  # 68.27%, 95.45%, 99.73% for 2 parameters
+                ax.contourf(values[0], values[1], delta.T, levels=[0] + levels, alpha=0.4)
+                contours = ax.contour(values[0], values[1], delta.T, levels=levels, linewidths=3)
+                ax.clabel(contours, fmt={2.30: r'$1\sigma$', 6.18: r'$2\sigma$', 11.83: r'$3\sigma$'})
+                ax.plot(self.ep[indices[0]], self.ep[indices[1]], '+', ms=30, mew=3, color='k')
+                ax.set(title=r'$\chi^2\ Contours$', xlabel=names[0], ylabel=names[1])
+            ax.xaxis.set_minor_locator(AutoMinorLocator())
+            ax.yaxis.set_minor_locator(AutoMinorLocator())
+            ax.grid()
+            plt.tight_layout()
@@ -0,0 +1,172 @@
+import numpy as np
+import pandas as pd
+import json
+import os
+from typing import List
+
+results_extensions = ('.json', '.npz', '.parquet')
+
+
+class FitResult:
+    """
+    The outcome of a fit, without the data and the solver state which Fit holds.
+
+    The parameters, their standard deviations and covariance matrix are float64 arrays, metadata is a dict of
+    JSON values (method, initial parameters, model and data files...). The attributes are slotted, so a history
+    of thousands of results costs little more than their arrays. Lists of results are saved and loaded in bulk
+    by save_results and load_results.
+    """
+    __slots__ = ('ep', 'sd_ep', 'cov', 'chi2', 'dof', 'pvalue', 'metadata')
+
+    def __init__(self,
+                 ep: np.ndarray,
+                 sd_ep: np.ndarray,
+                 cov: np.ndarray,
+                 chi2: float,
+                 dof: int,
+                 pvalue: float,
+                 metadata: dict = None):
+        self.ep = np.asarray(ep, dtype=np.float64)
+        self.sd_ep = np.asarray(sd_ep, dtype=np.float64)
+        self.cov = np.asarray(cov, dtype=np.float64)
+        self.chi2 = float(chi2)
+        self.dof = int(dof)
+        self.pvalue = float(pvalue)
+        self.metadata = {} if metadata is None else metadata
+
+    @classmethod
+    def from_fit(cls, fit, **metadata) -> "FitResult":
+        """
+        The result of a Fit, the keyword arguments are added to its metadata (e.g the data file).
+        """
+        if fit.method == 'odr':
+            cov = fit.output.cov_beta * fit.output.res_var  # The covariance which sd_beta is the square root of
+        else:
+            cov = fit.cov_ep
+        metadata = dict(method=fit.method,
+                        init_params=np.asarray(fit.init_params, dtype=np.float64).tolist(),
+                        npoints=len(fit.fitted_data()[0]),
+                        **metadata)
+        return cls(np.array(fit.ep, dtype=np.float64), np.array(fit.sd_ep, dtype=np.float64), np.array(cov, dtype=np.float64),
+                   fit.chi2, fit.dof, fit.pvalue, metadata)
+
+    @property
+    def chi2red(self) -> float:
+        with np.errstate(divide='ignore', invalid='ignore'):  # inf without degrees of freedom, as Fit reports it
+            return float(np.float64(self.chi2) / self.dof)
+
+    def to_dict(self) -> dict:
+        return {'ep': self.ep.tolist(),
+                'sd_ep': self.sd_ep.tolist(),
+                'cov': self.cov.tolist(),
+                'chi2': self.chi2,
+                'dof': self.dof,
+                'pvalue': self.pvalue,
+                'metadata': self.metadata}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "FitResult":
+        return cls(d['ep'], d['sd_ep'], d['cov'], d['chi2'], d['dof'], d['pvalue'], d.get('metadata'))
+
+    def __str__(self):
+        str = ''
+        for i, a in enumerate(self.ep):
+            str += f'a[{i}] = {a} +- {self.sd_ep[i]} ({abs(self.sd_ep[i]*100/a):.2f}% Relative Error)\n'
+
+        str += f'\nDoF = {self.dof:.2f}\n'
+        str += f'chi squared = {self.chi2:.2f}\n'
+        str += f'pvalue = {self.pvalue:.2f}\n'
+        str += f'chi squared reduced = {self.chi2red:.2f}\n'
+        for key, value in self.metadata.items():
+            str += f'{key} = {value}\n'
+        return str
+
+
+def results_arrays(results: List[FitResult]) -> dict:
+    """
+    The results stacked into arrays of one row per result, the parameters are padded with NaN
+    to the largest number of parameters and nparams holds the number of every row.
+    """
+    nparams = np.array([len(result.ep) for result in results], dtype=np.int64)
+    width = nparams.max(initial=0)
+
+    ep = np.full((len(results), width), np.nan)
+    sd_ep = np.full((len(results), width), np.nan)
+    cov = np.full((len(results), width, width), np.nan)
+    for i, result in enumerate(results):
+        n = nparams[i]
+        ep[i, :n] = result.ep
+        sd_ep[i, :n] = result.sd_ep
+        cov[i, :n, :n] = result.cov
+
+    return dict(nparams=nparams,
+                ep=ep,
+                sd_ep=sd_ep,
+                cov=cov,
+                chi2=np.array([result.chi2 for result in results], dtype=np.float64),
+                dof=np.array([result.dof for result in results], dtype=np.int64),
+                pvalue=np.array([result.pvalue for result in results], dtype=np.float64),
+                metadata=np.array([json.dumps(result.metadata) for result in results], dtype=str))
+
+
+def arrays_results(arrays: dict) -> List[FitResult]:
+    """
+    The inverse of results_arrays.
+    """
+    results = []
+    for i, n in enumerate(arrays['nparams']):
+        results.append(FitResult(arrays['ep'][i, :n], arrays['sd_ep'][i, :n], arrays['cov'][i, :n, :n],
+                                 arrays['chi2'][i], arrays['dof'][i], arrays['pvalue'][i],
+                                 json.loads(arrays['metadata'][i])))
+    return results
+
+
+def save_results(results: List[FitResult], path: str) -> None:
+    """
+    Save results to a .json (a list of FitResult.to_dict), .npz (results_arrays) or .parquet file
+    (results_arrays as a table with a column per parameter, e.g ep_0, sd_ep_0, cov_0_1, which needs pyarrow
+    or fastparquet).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, 'w') as f:
+            json.dump([result.to_dict() for result in results], f)
+    elif ext == '.npz':
+        np.savez(path, **results_arrays(results))
+    elif ext == '.parquet':
+        arrays = results_arrays(results)
+        width = arrays['ep'].shape[1]
+        columns = {name: arrays[name] for name in ('nparams', 'chi2', 'dof', 'pvalue', 'metadata')}
+        for i in range(width):
+            columns[f'ep_{i}'] = arrays['ep'][:, i]
+            columns[f'sd_ep_{i}'] = arrays['sd_ep'][:, i]
+        for i in range(width):
+            for j in range(width):
+                columns[f'cov_{i}_{j}'] = arrays['cov'][:, i, j]
+        pd.DataFrame(columns).to_parquet(path, index=False)
+    else:
+        raise ValueError(f"Can not save {path}, the formats are {', '.join(results_extensions)}")
+
+
+def load_results(path: str) -> List[FitResult]:
+    """
+    Load the results which save_results saved to path.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.json':
+        with open(path, 'r') as f:
+            return [FitResult.from_dict(d) for d in json.load(f)]
+    elif ext == '.npz':
+        with np.load(path) as arrays:
+            return arrays_results({name: arrays[name] for name in arrays.files})
+    elif ext == '.parquet':
+        table = pd.read_parquet(path)
+        width = int(table['nparams'].max()) if len(table) else 0
+        arrays = {name: table[name].to_numpy() for name in ('nparams', 'chi2', 'dof', 'pvalue', 'metadata')}
+        arrays['ep'] = table[[f'ep_{i}' for i in range(width)]].to_numpy(dtype=np.float64)
+        arrays['sd_ep'] = table[[f'sd_ep_{i}' for i in range(width)]].to_numpy(dtype=np.float64)
+        arrays['cov'] = table[[f'cov_{i}_{j}' for i in range(width) for j in range(width)]].to_numpy(dtype=np.float64)
+        arrays['cov'] = arrays['cov'].reshape(len(table), width, width)
+        return arrays_results(arrays)
+    else:
+        raise ValueError(f"Can not load {path}, the formats are {', '.join(results_extensions)}")
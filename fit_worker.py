@@ -0,0 +1,200 @@
+import numpy as np
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+from typing import Callable, List, Union
+from load_data import LoadData
+from fit import Fit
+from multistart import MultiStart
+
+
+class FitWorkerSignals(QObject):
+    """
+    QRunnable is not a QObject, so the signals of a worker live on this helper object.
+
+    Every signal carries the job id so the GUI can tell queued fits apart.
+    """
+    started = pyqtSignal(int)
+    progress = pyqtSignal(int, str)  # job id, name of the stage that is running
+    finished = pyqtSignal(int, object)  # job id, the Fit instance
+    error = pyqtSignal(int, str, str)  # job id, error type, error message
+    cancelled = pyqtSignal(int)
+
+
+class FitWorker(QRunnable):
+    """
+    Loads the data file and runs the fit outside of the Qt event loop.
+
+    Plotting is left to the GUI thread since matplotlib figures must be created there.
+    The solvers can not be interrupted in the middle of a run, so a cancelled job is stopped
+    at the next stage boundary and its result is never delivered.
+    """
+
+    def __init__(self,
+                 job_id: int,
+                 load_kwargs: dict,
+                 fit_kwargs: dict,
+                 multi_start_kwargs: dict = None
+                 ):
+        """
+        :param load_kwargs: keyword arguments for LoadData
+        :param fit_kwargs: keyword arguments for Fit, except for 'data'
+        :param multi_start_kwargs: if given, search for the best fit by MultiStart with these keyword arguments
+        (except for those which it shares with Fit) instead of a single fit from p0
+        """
+        super(FitWorker, self).__init__()
+
+        self.job_id = job_id
+        self.load_kwargs = load_kwargs
+        self.fit_kwargs = fit_kwargs
+        self.multi_start_kwargs = multi_start_kwargs
+
+        self.signals = FitWorkerSignals()
+        self.is_cancelled = False
+
+    def cancel(self) -> None:
+        self.is_cancelled = True
+
+    def run(self) -> None:
+        try:
+            if self.is_cancelled:
+                self.signals.cancelled.emit(self.job_id)
+                return
+            self.signals.started.emit(self.job_id)
+
+            self.signals.progress.emit(self.job_id, 'Loading data')
+            loaded = LoadData(**self.load_kwargs)
+            if self.is_cancelled:
+                self.signals.cancelled.emit(self.job_id)
+                return
+
+            self.signals.progress.emit(self.job_id, 'Fitting')
+            fit_kwargs = dict(self.fit_kwargs, colorder=loaded.colorder(self.fit_kwargs['colorder']))
+            if self.multi_start_kwargs is None:
+                fit = Fit(loaded.data, **fit_kwargs)
+            else:
+                fit = MultiStart(loaded.data,
+                                 colorder=fit_kwargs['colorder'],
+                                 x_range=fit_kwargs['x_range'],
+                                 method=fit_kwargs['method'],
+                                 p0=fit_kwargs['p0'],
+                                 callback=lambda ndone, ntotal: self.signals.progress.emit(self.job_id, f'Multi-Start {ndone}/{ntotal}'),
+                                 is_cancelled=lambda: self.is_cancelled,
+                                 **self.multi_start_kwargs).fit
+            if self.is_cancelled:
+                self.signals.cancelled.emit(self.job_id)
+                return
+
+            self.signals.finished.emit(self.job_id, fit)
+
+        except Exception as e:
+            self.signals.error.emit(self.job_id, type(e).__name__, str(e))
+
+
+class DataWorker(QRunnable):
+    """
+    Loads a data file outside of the Qt event loop, finished delivers its [x, dx, y, dy] float64 columns
+    (None for a missing column) inside the x range.
+    """
+
+    def __init__(self,
+                 job_id: int,
+                 load_kwargs: dict,
+                 colorder: List[Union[int, None]],
+                 x_range: Union[List[float], None]
+                 ):
+        """
+        :param load_kwargs: keyword arguments for LoadData
+        :param colorder: [x_col, dx_col, y_col, dy_col] of the data file
+        """
+        super(DataWorker, self).__init__()
+
+        self.job_id = job_id
+        self.load_kwargs = load_kwargs
+        self.colorder = colorder
+        self.x_range = x_range
+
+        self.signals = FitWorkerSignals()
+
+    def run(self) -> None:
+        try:
+            self.signals.started.emit(self.job_id)
+            loaded = LoadData(**self.load_kwargs)
+            columns = [None if col is None else np.asarray(loaded.data[:, col], dtype=np.float64)
+                       for col in loaded.colorder(self.colorder)]
+            if self.x_range is not None:
+                inside = (self.x_range[0] <= columns[0]) & (columns[0] <= self.x_range[1])
+                columns = [None if col is None else col[inside] for col in columns]
+            self.signals.finished.emit(self.job_id, columns)
+
+        except Exception as e:
+            self.signals.error.emit(self.job_id, type(e).__name__, str(e))
+
+
+class PoolWorker(QRunnable):
+    """
+    Runs a job whose tasks run on a process pool (batch_fit, Bootstrap, export_figures...) outside of the Qt event loop.
+
+    progress is emitted as (job id, 'n/N') whenever a task is done, finished delivers what the job returns.
+    """
+
+    def __init__(self,
+                 job_id: int,
+                 job: Callable,
+                 job_kwargs: dict
+                 ):
+        """
+        :param job: a function which accepts the keyword arguments 'callback' and 'is_cancelled' of run_pool
+        :param job_kwargs: the other keyword arguments of job
+        """
+        super(PoolWorker, self).__init__()
+
+        self.job_id = job_id
+        self.job = job
+        self.job_kwargs = job_kwargs
+
+        self.signals = FitWorkerSignals()
+        self.is_cancelled = False
+
+    def cancel(self) -> None:
+        self.is_cancelled = True
+
+    def run(self) -> None:
+        try:
+            self.signals.started.emit(self.job_id)
+            result = self.job(callback=lambda ndone, ntotal: self.signals.progress.emit(self.job_id, f'{ndone}/{ntotal}'),
+                              is_cancelled=lambda: self.is_cancelled,
+                              **self.job_kwargs)
+            self.signals.finished.emit(self.job_id, result)
+
+        except Exception as e:
+            self.signals.error.emit(self.job_id, type(e).__name__, str(e))
+
+
+class ScanWorker(QRunnable):
+    """
+    Runs Fit.scan outside of the Qt event loop, finished delivers (fit, indices, values, chi2) for fit.plot_scan.
+    """
+
+    def __init__(self,
+                 job_id: int,
+                 fit: Fit,
+                 scan_kwargs: dict
+                 ):
+        """
+        :param scan_kwargs: keyword arguments for fit.scan
+        """
+        super(ScanWorker, self).__init__()
+
+        self.job_id = job_id
+        self.fit = fit
+        self.scan_kwargs = scan_kwargs
+
+        self.signals = FitWorkerSignals()
+
+    def run(self) -> None:
+        try:
+            self.signals.started.emit(self.job_id)
+            chi2 = self.fit.scan(**self.scan_kwargs)
+            self.signals.finished.emit(self.job_id, (self.fit, self.scan_kwargs['indices'], self.scan_kwargs['values'], chi2))
+
+        except Exception as e:
+            self.signals.error.emit(self.job_id, type(e).__name__, str(e))
@@ -0,0 +1,189 @@
+"""
+Headless command line interface of FitGUI, for scripted fits and for machines without a display.
+
+Takes the same inputs as the GUI and prints the results as standard JSON (non-finite numbers are null), e.g:
+
+    python -m fitcli Data/data.csv --model "ODR Functions/example_linear_odr.py" --cols 0 1 2 3 --p0 1 0
+"""
+import matplotlib
+matplotlib.use('Agg')  # Must precede any pyplot import, Fit imports pyplot
+
+import argparse
+import json
+import os
+import sys
+import numpy as np
+from typing import List, Union
+from load_data import LoadData
+from model_loader import load_model
+from batch import batch_datasets, batch_fit
+from fit import Fit
+from bootstrap import Bootstrap
+from multistart import MultiStart
+from export import export_figures, figure_formats, fit_figures
+from fit_result import FitResult, save_results
+
+
+def parse_args(argv: List[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog='python -m fitcli', description='Fit a model to a data file without the GUI.')
+    parser.add_argument('data', help='data file (CSV, Excel, .npy or HDF5). With --batch, a directory or a glob pattern')
+    parser.add_argument('--model', required=True, help='python script which defines "fit_function"')
+    parser.add_argument('--method', choices=['odr', 'ls'], default='odr', help='ODR or Least Squares (default: odr)')
+    parser.add_argument('--cols', nargs=4, required=True, metavar=('X', 'DX', 'Y', 'DY'),
+                        help='0 indexed columns of x, dx, y and dy. Use "none" for a missing dx or dy')
+    parser.add_argument('--p0', nargs='+', type=float, required=True, help='initial parameters')
+    parser.add_argument('--sheet', default=0, help='sheet name or position (Excel), dataset name (HDF5)')
+    parser.add_argument('--x-range', nargs=2, type=float, metavar=('LOW', 'HIGH'), help='fit only LOW <= x <= HIGH')
+    parser.add_argument('--no-headers', action='store_true', help='the first row is data and not column names')
+    parser.add_argument('--remove', nargs='+', type=int, metavar='INDEX', help='0 indexed points to remove, the first data row is 0 whether or not the file has a header row')
+    parser.add_argument('--auto-jacobian', action='store_true',
+                        help='derive the derivatives of fit_function by automatic differentiation')
+    parser.add_argument('--jit', action='store_true', help='compile fit_function with Numba (if installed)')
+    parser.add_argument('--batch', action='store_true', help='fit every data file which matches "data"')
+    parser.add_argument('--all-sheets', action='store_true',
+                        help='with --batch, fit every sheet of every workbook and every dataset of every HDF5 file')
+    parser.add_argument('--processes', type=int, help='with --batch or --bootstrap, number of worker processes')
+    parser.add_argument('--bootstrap', type=int, metavar='N', help='estimate the uncertainties by N refits, see Bootstrap')
+    parser.add_argument('--bootstrap-mode', choices=['resample', 'perturb'], default='resample',
+                        help='resample the points, or perturb them by dx and dy (default: resample)')
+    parser.add_argument('--bounds', nargs='+', type=float, metavar='LOW HIGH',
+                        help='search for the best fit from many initial parameters inside these bounds of every parameter')
+    parser.add_argument('--starts', type=int, default=64, help='with --bounds, number of initial parameters (default: 64)')
+    parser.add_argument('--seed', type=int, help='with --bootstrap or --bounds, seed of the random streams')
+    parser.add_argument('--export', metavar='DIR', help='save the fit, residuals and initial guess plots to DIR')
+    parser.add_argument('--export-format', nargs='+', choices=figure_formats, default=['png'],
+                        help='with --export, formats of the figures (default: png)')
+    parser.add_argument('--dpi', type=float, default=100, help='with --export, resolution of the figures (default: 100)')
+    parser.add_argument('--labels', nargs=3, default=['Fit', 'x', 'y'], metavar=('TITLE', 'XLABEL', 'YLABEL'),
+                        help='with --export, labels of the plots (LaTeX math, default: Fit x y)')
+    parser.add_argument('--save-result', metavar='PATH', help='also save the result as a FitResult (.json, .npz or .parquet), not with --batch')
+    return parser.parse_args(argv)
+
+
+def parse_colorder(cols: List[str]) -> List[Union[int, None]]:
+    return [None if col.lower() == 'none' else int(col) for col in cols]
+
+
+def fit_summary(result: FitResult) -> dict:
+    return {'ep': result.ep.tolist(),
+            'sd_ep': result.sd_ep.tolist(),
+            'cov': result.cov.tolist(),
+            'chi2': result.chi2,
+            'dof': result.dof,
+            'chi2red': result.chi2red,
+            'pvalue': result.pvalue,
+            'init_params': result.metadata['init_params'],
+            'method': result.metadata['method']}
+
+
+def json_safe(value):
+    """
+    value with every non-finite float (inf covariances, NaN of a failed fit...) replaced by None,
+    which standard JSON can represent.
+    """
+    if isinstance(value, dict):
+        return {key: json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(item) for item in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+
+def print_json(value) -> None:
+    json.dump(json_safe(value), sys.stdout, indent=4, allow_nan=False)
+    print()
+
+
+def export_report(args: argparse.Namespace) -> dict:
+    """
+    The plots to export and their labels, as the GUI reports them (see fit_figures).
+    """
+    title, xlabel, ylabel = args.labels
+    return dict(plot_fit=True, plot_residuals=True, plot_initial_guess=True,
+                title=title, xlabel=xlabel, ylabel=ylabel, residuals_ylabel=ylabel)
+
+
+def main(argv: List[str] = None) -> int:
+    args = parse_args(argv)
+
+    colorder = parse_colorder(args.cols)
+    if args.method == 'ls':
+        colorder[1] = None  # As in the GUI, dx is not used by Least Squares
+    sheet = int(args.sheet) if str(args.sheet).isdigit() else args.sheet
+    x_range = args.x_range
+    if args.export is not None:
+        os.makedirs(args.export, exist_ok=True)
+
+    if args.batch:
+        export = None if args.export is None else dict(directory=args.export, formats=args.export_format, dpi=args.dpi,
+                                                       report=export_report(args))
+        table = batch_fit(batch_datasets(args.data, args.all_sheets), args.model, colorder, args.p0, x_range,
+                          args.method, not args.no_headers, args.processes, args.auto_jacobian, args.jit, export)
+        table = table.reset_index()
+        print_json(table.to_dict(orient='records'))
+        return int((table['error'] != '').any())
+
+    try:
+        results = fit_file(args, colorder, sheet, x_range)
+    except Exception as e:
+        print_json({'error': f'{type(e).__name__}: {e}'})
+        return 1
+
+    print_json(results)
+    return 0
+
+
+def fit_file(args: argparse.Namespace, colorder: List[Union[int, None]], sheet: Union[str, int], x_range) -> dict:
+    loaded = LoadData(args.data,
+                      indices_to_remove=args.remove,
+                      headers=not args.no_headers,
+                      delete_points=args.remove is not None,
+                      sheet_name=sheet,
+                      columns=[col for col in colorder if col is not None])
+
+    if args.bounds:
+        if len(args.bounds) % 2:
+            raise ValueError('--bounds takes LOW HIGH of every parameter')
+        search = MultiStart(loaded.data, loaded.colorder(colorder), np.reshape(args.bounds, (-1, 2)), args.model, x_range,
+                            args.method, args.starts, args.p0, args.seed, args.processes, args.jit, args.auto_jacobian)
+        fit = search.fit
+    else:
+        model = load_model(args.model, args.jit)
+        fit = Fit(loaded.data, loaded.colorder(colorder), args.p0, model.fit_function, x_range, args.method,
+                  linear=model.linear, **model.derivatives(args.method, args.p0, args.auto_jacobian))
+
+    result = FitResult.from_fit(fit, model=args.model, data=args.data, sheet=sheet, x_range=x_range)
+    if args.save_result is not None:
+        save_results([result], args.save_result)
+
+    results = fit_summary(result)
+    if args.bounds:
+        results['multi_start'] = {'starts': len(search.starts),
+                                  'failed': int(search.nfailed),
+                                  'seed': search.seed,
+                                  'minima': [{'chi2': float(chi2), 'ep': ep.tolist(), 'starts': count}
+                                             for chi2, ep, count in search.minima]}
+    results.update(data=args.data, sheet=sheet, model=args.model, x_range=x_range)
+
+    if args.bootstrap:
+        resampled = Bootstrap(fit, args.model, args.bootstrap, args.bootstrap_mode, args.seed,
+                              processes=args.processes, jit=args.jit, auto_jacobian=args.auto_jacobian)
+        results['bootstrap'] = {'mode': resampled.mode,
+                                'n': int(resampled.n),
+                                'failed': int(resampled.nfailed),
+                                'seed': resampled.seed,
+                                'sd_ep': resampled.sd_ep.tolist(),
+                                'level': resampled.level,
+                                'intervals': resampled.intervals.tolist(),
+                                'correlation': None if resampled.correlation is None else resampled.correlation.tolist()}
+
+    if args.export is not None:
+        figures = [figure for fmt in args.export_format
+                   for figure in fit_figures(export_report(args), args.export, 'Fit', fmt, args.dpi)]
+        results['figures'] = export_figures([(fit, args.model, figures)], args.jit, args.processes)
+    return results
+
+
+if __name__ == '__main__':
+    sys.exit(main())
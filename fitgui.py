@@ -1,21 +1,33 @@
 from PyQt5.QtWidgets import *
-from matplotlib.pyplot import show
+from PyQt5.QtCore import QThreadPool, Qt
+from matplotlib.pyplot import show, close, get_fignums
 from typing import List, Union
-from load_data import LoadData
-from fit import Fit
-import importlib.util
+from fit_worker import DataWorker, FitWorker, PoolWorker, ScanWorker
+from export import export_figures, figure_formats, fit_figures
+from fit_result import FitResult, load_results, save_results
+from batch import batch_datasets, batch_fit
+from bootstrap import Bootstrap
+from plot_panel import PlotPanel
+from preview import GuessPreview
+from load_data import LoadData, hdf5_datasets, sheet_names, excel_extensions
+from model_loader import load_model
 import sys
-from pathlib import Path
-from typing import TYPE_CHECKING
 import json
-from os.path import exists
-from openpyxl import load_workbook
+from os.path import exists, getsize
+from os import cpu_count
 from PyQt5.QtGui import QFont
 
-if TYPE_CHECKING:
-    import types
+# CSV files larger than this are streamed in chunks of stream_chunksize rows, see LoadData
+stream_threshold = 256 * 1024 ** 2
+stream_chunksize = 10 ** 6
 
-help_data = '* Data file must be an Excel file or a CSV file.\n'
+# The fit plots are embedded and reused, the other plots (e.g chi2 scans) open windows of their own.
+# Once there are more of those, the oldest are closed
+max_figures = 10
+
+help_data = '* Data file must be an Excel file, a CSV file, a NumPy .npy file or an HDF5 file.\n' \
+            '\n* Binary files (.npy, HDF5) must hold a 2D float array, one column per quantity.\n' \
+            '\n* For HDF5 files choose the dataset in the "Sheet" box.\n'
 help_model = '* Every fitting function MUST be written in a different python script.\n' \
              '\n* The name of the script is irrelevant to the operation of the code, different fitting function that are written should be identifyable by the script name.\n' \
              '\n* The name of the function MUST be PRECISELY "fit_function".\n' \
@@ -26,7 +38,13 @@ help_model = '* Every fitting function MUST be written in a different python scr
              '\n2. The LeastSquares algorithm requires that the fitting function takes X as the first argument and the fitting parameters will be all the rest arguments:\n' \
              '\n\tdef fit_function(x, a, b):\n' \
              '\t\treturn a * x + b\n' \
-             '\n* Please refer to the attached example scripts: "example_linear_odr.py", "example_linear_least_squares.py"\n'
+             '\n* Please refer to the attached example scripts: "example_linear_odr.py", "example_linear_least_squares.py"\n' \
+             '\n* Optionally, the script may also define the exact derivatives of "fit_function", which makes the fit faster:\n' \
+             '\n1. ODR: "fjacb(a, x)" returns the derivatives by each parameter (one row per parameter)\n' \
+             '\tand "fjacd(a, x)" returns the derivative by x. Both must be defined.\n' \
+             '\n2. Least Squares: "jacobian(x, a, b)" returns the derivatives by each parameter (one column per parameter).\n' \
+             '\n* Least Squares fits of functions which are linear in their parameters (e.g polynomials) are solved directly\n' \
+             '\tif the script declares it by "linear = True". The declaration is verified, otherwise the fit is iterative.\n'
 help_method = 'The ODR algorithm takes into account the errors in X,\n' \
               'where as the Least Squares one does not.\n' \
               'If the errors in the X axis are not important\n' \
@@ -63,7 +81,11 @@ help_initial = '* The number of the initial parameters that you provide\n' \
                '\tThe elements must be seperated by a comma and exactly one space ", ":\n' \
                '\tFor example: if you want to give the program "1" as the first parameter\n' \
                '\tand "2" as the second, you would write:\n' \
-               '\t\t"1, 2"'
+               '\t\t"1, 2"' \
+               '\n\n* Not sure about the initial parameters? Check "Multi-Start" and write bounds for every parameter:\n' \
+               '\tthe fit is repeated from many initial parameters inside the bounds (the fit itself is not bounded)\n' \
+               '\tand the best one is kept. The bounds are separated by "; ", for example:\n' \
+               '\t\t"0, 5; -1, 1"'
 help_labels = '* The program uses matplotlib to plot, and so accepts (only) Latex syntax\n' \
               '\n * Please refer to the following site for Latex symbols:\n' \
               '\nhttps://oeis.org/wiki/List_of_LaTeX_mathematical_symbols\n' \
@@ -72,37 +94,6 @@ help_labels = '* The program uses matplotlib to plot, and so accepts (only) Late
               '\tFor example, to display "Hellow World" inside the plot, you would enter in Latex syntax: "Hello\ World".'
 
 
-def import_source_file(fname: Union[str, Path], modname: str) -> "types.ModuleType":
-    """
-     Import a Python source file and return the loaded module.
-
-     Args:
-         fname: The full path to the source file.  It may container characters like `.`
-             or `-`.
-         modname: The name for the loaded module.  It may contain `.` and even characters
-             that would normally not be allowed (e.g., `-`).
-     Return:
-         The imported module
-
-     Raises:
-         ImportError: If the file cannot be imported (e.g, if it's not a `.py` file or if
-             it does not exist).
-         Exception: Any exception that is raised while executing the module (e.g.,
-             :exc:`SyntaxError).  These are errors made by the author of the module!
-     """
-    # https://docs.python.org/3/library/importlib.html#importing-a-source-file-directly
-    spec = importlib.util.spec_from_file_location(modname, fname)
-    if spec is None:
-        raise ImportError(f"Could not load spec for module '{modname}' at: {fname}")
-    module = importlib.util.module_from_spec(spec)
-    sys.modules[modname] = module
-    try:
-        spec.loader.exec_module(module)
-    except FileNotFoundError as e:
-        raise ImportError(f"{e.strerror}: {fname}") from e
-    return module
-
-
 class FitGUI(QMainWindow):
     def setup_ui(self) -> None:
 
@@ -174,6 +165,16 @@ class FitGUI(QMainWindow):
         self.comboBox_method.addItems(['Least Squares', 'ODR'])
         grid.addWidget(self.comboBox_method, 3, 2, 1, 2)
 
+        self.checkBox_autojac = QCheckBox(self.centralwidget)
+        self.checkBox_autojac.setText('Auto Jacobian')
+        self.checkBox_autojac.setToolTip('Derive the exact derivatives of "fit_function" instead of using finite differences')
+        grid.addWidget(self.checkBox_autojac, 3, 4, 1, 2)
+
+        self.checkBox_jit = QCheckBox(self.centralwidget)
+        self.checkBox_jit.setText('JIT Compile')
+        self.checkBox_jit.setToolTip('Compile "fit_function" with Numba, worthwhile for models with loops on large data sets')
+        grid.addWidget(self.checkBox_jit, 3, 6, 1, 2)
+
         # 5'th row
         self.checkBox_headers = QCheckBox(self.centralwidget)
         self.checkBox_headers.setText('Headers')
@@ -244,6 +245,24 @@ class FitGUI(QMainWindow):
         grid.addWidget(self.lineEdit_xrange, 6, 2, 1, 3)
         self.lineEdit_xrange.setDisabled(True)
 
+        self.checkBox_multistart = QCheckBox(self.centralwidget)
+        self.checkBox_multistart.setText('Multi-Start')
+        self.checkBox_multistart.setToolTip('Search for the best fit from many initial parameters inside the bounds,\n'
+                                            'on the number of processes of the Batch Fit window')
+        grid.addWidget(self.checkBox_multistart, 6, 5)
+
+        self.lineEdit_bounds = QLineEdit(self.centralwidget)
+        self.lineEdit_bounds.setPlaceholderText('low, high; low, high; ...')
+        grid.addWidget(self.lineEdit_bounds, 6, 6, 1, 2)
+        self.lineEdit_bounds.setDisabled(True)
+
+        self.spinBox_starts = QSpinBox(self.centralwidget)
+        self.spinBox_starts.setRange(2, 100000)
+        self.spinBox_starts.setValue(64)
+        self.spinBox_starts.setSuffix(' starts')
+        grid.addWidget(self.spinBox_starts, 6, 8, 1, 2)
+        self.spinBox_starts.setDisabled(True)
+
         # 7'th row
         self.label_params = QLabel(self.centralwidget)
         self.label_params.setText('Initial Parameters:')
@@ -256,6 +275,12 @@ class FitGUI(QMainWindow):
         self.lineEdit_params = QLineEdit(self.centralwidget)
         grid.addWidget(self.lineEdit_params, 7, 2, 1, 3)
 
+        self.checkBox_warmstart = QCheckBox(self.centralwidget)
+        self.checkBox_warmstart.setText('Warm Start')
+        self.checkBox_warmstart.setToolTip('Start from the solution of the previous fit of the same data file and model\n'
+                                           'instead of the initial parameters')
+        grid.addWidget(self.checkBox_warmstart, 7, 6, 1, 3)
+
         # 8'th row
         self.label_labels = QLabel(self.centralwidget)
         self.label_labels.setText('Labels:')
@@ -332,6 +357,17 @@ class FitGUI(QMainWindow):
         self.pushButton_fit.setText('Fit!')
         grid.addWidget(self.pushButton_fit, 14, 0, 1, 10)
 
+        # 15'th Row only appears while fits are running
+        self.progressBar_fit = QProgressBar(self.centralwidget)
+        self.progressBar_fit.setTextVisible(False)
+        grid.addWidget(self.progressBar_fit, 15, 0, 1, 8)
+        self.progressBar_fit.hide()
+
+        self.pushButton_cancel = QPushButton(self.centralwidget)
+        self.pushButton_cancel.setText('Cancel')
+        grid.addWidget(self.pushButton_cancel, 15, 8, 1, 2)
+        self.pushButton_cancel.hide()
+
         # Setting central widget
         self.centralwidget.setLayout(grid)
         self.setCentralWidget(self.centralwidget)
@@ -382,7 +418,39 @@ class FitGUI(QMainWindow):
         self.menuOpen.addSeparator()
         self.menuOpen.addAction(self.menuDefault_Path.menuAction())
 
+        self.actionBatch_Fit = QAction(self)
+        self.actionBatch_Fit.setText('Batch Fit')
+        self.actionBatch_Fit.setShortcut('Ctrl+B')
+
+        self.actionBootstrap = QAction(self)
+        self.actionBootstrap.setText('Bootstrap Last Fit')
+        self.actionBootstrap.setShortcut('Ctrl+Shift+B')
+
+        self.actionMonte_Carlo = QAction(self)
+        self.actionMonte_Carlo.setText('Monte Carlo Last Fit')
+        self.actionMonte_Carlo.setShortcut('Ctrl+Shift+M')
+
+        self.actionPreview = QAction(self)
+        self.actionPreview.setText('Initial Guess Preview')
+        self.actionPreview.setShortcut('Ctrl+P')
+
         self.menuRun.addAction(self.actionFit)
+        self.menuRun.addAction(self.actionBatch_Fit)
+        self.menuRun.addAction(self.actionPreview)
+        self.menuRun.addSeparator()
+        self.menuRun.addAction(self.actionBootstrap)
+        self.menuRun.addAction(self.actionMonte_Carlo)
+
+        self.actionScan = QAction(self)
+        self.actionScan.setText('Chi2 Scan Last Fit')
+        self.actionScan.setShortcut('Ctrl+Shift+S')
+        self.menuRun.addAction(self.actionScan)
+
+        self.actionExport = QAction(self)
+        self.actionExport.setText('Export Figures of Last Fit')
+        self.actionExport.setShortcut('Ctrl+E')
+        self.menuRun.addSeparator()
+        self.menuRun.addAction(self.actionExport)
 
         self.menubar.addAction(self.menuRun.menuAction())
         self.menubar.addAction(self.menuOpen.menuAction())
@@ -391,6 +459,8 @@ class FitGUI(QMainWindow):
 
         self.checkBox_delpoints.toggled['bool'].connect(self.lineEdit_listpoints.setEnabled)
         self.checkBox_xrange.toggled['bool'].connect(self.lineEdit_xrange.setEnabled)
+        self.checkBox_multistart.toggled['bool'].connect(self.lineEdit_bounds.setEnabled)
+        self.checkBox_multistart.toggled['bool'].connect(self.spinBox_starts.setEnabled)
 
         self.actionSet_Default_Data_Path.triggered.connect(lambda: self.set_default_path('Data'))
         self.actionSet_Default_ODR_Model_Path.triggered.connect(lambda: self.set_default_path('ODR'))
@@ -408,9 +478,20 @@ class FitGUI(QMainWindow):
 
         self.pushButton_fit.clicked.connect(self.fit)
         self.actionFit.triggered.connect(self.fit)
+        self.pushButton_cancel.clicked.connect(self.cancel_fits)
 
         self.pushButton_fitresults.clicked.connect(self.results_window.show)
 
+        self.actionBatch_Fit.triggered.connect(self.batch_window.show)
+
+        self.actionBootstrap.triggered.connect(lambda: self.bootstrap('resample'))
+        self.actionMonte_Carlo.triggered.connect(lambda: self.bootstrap('perturb'))
+        self.actionScan.triggered.connect(self.scan)
+        self.actionExport.triggered.connect(self.export_figures)
+
+        self.actionPreview.triggered.connect(self.preview_guess)
+        self.lineEdit_params.textEdited.connect(self.preview_params_edited)
+
         # Help buttons
 
         self.toolButton_help_data_file.clicked.connect(lambda: self.popupmsg(help_data, 'help'))
@@ -446,8 +527,105 @@ class FitGUI(QMainWindow):
         self.save_fit_results_button.clicked.connect(self.save_results_txt)
         self.results_layout.addWidget(self.save_fit_results_button)
 
+        # The structured results of the history, for other programs and for load_history
+        self.save_history_button = QPushButton('Save Results Table')
+        self.save_history_button.clicked.connect(self.save_history)
+        self.results_layout.addWidget(self.save_history_button)
+
+        self.load_history_button = QPushButton('Load Results Table')
+        self.load_history_button.clicked.connect(self.load_history)
+        self.results_layout.addWidget(self.load_history_button)
+
         self.results_window.setLayout(self.results_layout)
 
+    def setup_plot_panel(self) -> None:
+        """
+        The plots of the last fit, docked next to the main window. Every fit redraws the same figures.
+        """
+        self.plot_panel = PlotPanel()
+
+        self.plot_dock = QDockWidget('Plots', self)
+        self.plot_dock.setWidget(self.plot_panel)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.plot_dock)
+        self.plot_dock.hide()
+
+    def setup_preview_window(self) -> None:
+        """
+        The data and the curve of the initial parameters, updated live as they are typed or moved by the sliders.
+        """
+        self.preview_window = QWidget()
+        self.preview_window.setWindowTitle('Initial Guess Preview')
+        self.preview_window.setMinimumSize(600, 600)
+
+        preview_layout = QVBoxLayout()
+
+        self.guess_preview = GuessPreview()
+        self.guess_preview.params_changed.connect(
+            lambda params: self.lineEdit_params.setText(', '.join(f'{p:.6g}' for p in params)))
+        preview_layout.addWidget(self.guess_preview)
+
+        self.pushButton_previewreload = QPushButton('Reload Data and Model')
+        self.pushButton_previewreload.clicked.connect(self.preview_guess)
+        preview_layout.addWidget(self.pushButton_previewreload)
+
+        self.preview_window.setLayout(preview_layout)
+
+    def setup_batch_window(self) -> None:
+        """
+        Fits the model, columns, initial parameters, x range and method of the main window
+        to every data file which matches a directory or a glob pattern.
+        """
+        self.batch_window = QWidget()
+
+        self.batch_window.setWindowTitle('Batch Fit')
+        self.batch_window.setMinimumSize(800, 600)
+
+        batch_grid = QGridLayout()
+
+        self.label_batchfiles = QLabel('Data Files:')
+        batch_grid.addWidget(self.label_batchfiles, 0, 0)
+
+        self.lineEdit_batchfiles = QLineEdit()
+        self.lineEdit_batchfiles.setPlaceholderText('A directory or a glob pattern, e.g. Data/run_*.csv')
+        batch_grid.addWidget(self.lineEdit_batchfiles, 0, 1, 1, 3)
+
+        self.pushButton_batchbrowse = QPushButton('Browse')
+        self.pushButton_batchbrowse.clicked.connect(self.browsebatchdir)
+        batch_grid.addWidget(self.pushButton_batchbrowse, 0, 4)
+
+        self.checkBox_allsheets = QCheckBox('Every Sheet')
+        batch_grid.addWidget(self.checkBox_allsheets, 1, 0)
+
+        self.label_processes = QLabel('Processes:')
+        batch_grid.addWidget(self.label_processes, 1, 1)
+
+        self.spinBox_processes = QSpinBox()
+        self.spinBox_processes.setRange(1, cpu_count())
+        self.spinBox_processes.setValue(cpu_count())
+        batch_grid.addWidget(self.spinBox_processes, 1, 2)
+
+        self.pushButton_batchrun = QPushButton('Run')
+        self.pushButton_batchrun.clicked.connect(self.batch_fit)
+        batch_grid.addWidget(self.pushButton_batchrun, 2, 0, 1, 3)
+
+        self.pushButton_batchcancel = QPushButton('Cancel')
+        self.pushButton_batchcancel.setEnabled(False)
+        batch_grid.addWidget(self.pushButton_batchcancel, 2, 3, 1, 2)
+
+        self.progressBar_batch = QProgressBar()
+        batch_grid.addWidget(self.progressBar_batch, 3, 0, 1, 5)
+
+        self.table_batch = QTableWidget()
+        self.table_batch.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        batch_grid.addWidget(self.table_batch, 4, 0, 1, 5)
+
+        self.pushButton_batchsave = QPushButton('Save')
+        self.pushButton_batchsave.setEnabled(False)
+        self.pushButton_batchsave.clicked.connect(self.save_batch_csv)
+        batch_grid.addWidget(self.pushButton_batchsave, 5, 0, 1, 5)
+
+        self.batch_window.setLayout(batch_grid)
+
     def __init__(self) -> None:
         super(FitGUI, self).__init__()
 
@@ -459,6 +637,12 @@ class FitGUI(QMainWindow):
 
         self.setup_results_window()
 
+        self.setup_batch_window()
+
+        self.setup_plot_panel()
+
+        self.setup_preview_window()
+
         self.add_functionality()
 
         # Loading configuration
@@ -479,6 +663,20 @@ class FitGUI(QMainWindow):
                 self.default_ls_path = self.config['Least Squares']
 
         self.fit_number = 0
+        self.last_fit = None  # The Fit of the last finished fit, which Bootstrap, Chi2 Scan and Export work on
+        self.last_fit_number = None  # Its fit number, which labels their results
+        self.preview_number = 0  # The last data load of the initial guess preview, older loads are dropped
+        self.preview_model = None  # (fit function, method) of that load
+
+        # Fits run on a thread pool so the window stays responsive, several fits can be queued
+        self.thread_pool = QThreadPool()
+        self.jobs = {}  # job id (the fit number) -> (FitWorker, dict of the inputs needed to report the results)
+        self.bootstrap_worker = None  # The running bootstrap, which the cancel button stops as well
+
+        # (data file, sheet, headers, columns, model file, model digest, method) -> Fit.warm_state() of the last fit of that pair
+        self.warm_states = {}
+
+        self.results: List[FitResult] = []  # The results of the history, see save_history
 
         self.show()
 
@@ -494,96 +692,59 @@ class FitGUI(QMainWindow):
 
             headers = self.checkBox_headers.isChecked()
 
-            self.xcol = self.spinBox_xcol.value()
-            self.ycol = self.spinBox_ycol.value()
-
-            if self.checkBox_dy.isChecked():
-                self.dycol = self.spinBox_dycol.value()
-            else:
-                self.dycol = None
-
-            if self.method == 'odr':
-                self.dxcol = self.spinBox_dxcol.value()
-            else:
-                self.dxcol = None  # if method == 'ls' the Fit class doesn't even access colorder: List[int] [1] (the
-                # second entry in the colorder list)
-
-            self.check_identical_cols_nums()
-
-            delpoints = self.checkBox_delpoints.isChecked()
-            points_to_remove: List[str] = self.lineEdit_listpoints.text().split(', ')
-            indices_to_remove = None
-            if delpoints:
-                indices_to_remove = [int(p) for p in points_to_remove]
-
-            data_file_ext = self.get_data_file_ext()
-
-            if data_file_ext in ['.xlsx', '.xlsm']:
-
-                data = LoadData(path=self.lineEdit_pathdata.text(),
-                                indices_to_remove=indices_to_remove,
-                                headers=headers,
-                                delete_points=delpoints,
-                                sheet_name=self.comboBox_sheets.currentText()).data
-            else:
-                data = LoadData(path=self.lineEdit_pathdata.text(),
-                                indices_to_remove=indices_to_remove,
-                                headers=headers,
-                                delete_points=delpoints).data
-
-            # if delpoints:
-            #     data = LoadData(self.lineEdit_pathdata.text(), [int(p) for p in points_to_remove], headers,
-            #                     delpoints).data
-            # else:
-            #     data = LoadData(self.lineEdit_pathdata.text(), headers=headers).data
+            colorder = self.get_colorder()
 
             init_params: List[str] = self.lineEdit_params.text().split(', ')
 
-            isxrange = self.checkBox_xrange.isChecked()
-            x_range = None
-            if isxrange:
-                x_range: List[str] = self.lineEdit_xrange.text().split(', ')
-                if len(x_range) > 2:
-                    self.popupmsg("Only 2 items in x range!", "error")
-                x_range = [float(x) for x in x_range]
-
-            self.fit = Fit(
-                data,
-                [self.xcol, self.dxcol, self.ycol, self.dycol],
-                [float(p) for p in init_params],
-                self.fit_function,
-                x_range,
-                self.method,
-            )
-
-            title = self.lineEdit_fittitle.text()
-            xlabel = self.lineEdit_fitxlabel.text()
-            ylabel = self.lineEdit_fitylabel.text()
-            residuals_ylabel = self.lineEdit_resylabel.text()
-
-            if self.checkBox_fit.isChecked():
-                self.fit.plot_fit(title, xlabel, ylabel, self.fit_number)
-            if self.checkBox_residuals.isChecked():
-                self.fit.plot_residuals(xlabel, residuals_ylabel, self.fit_number)
-            if self.checkBox_initguess.isChecked():
-                self.fit.plot_initial_guess(xlabel, ylabel, self.fit_number)
-
-            self.apply_fit_number(self.fit_number)
-
-            self.results_textbox.append('\nFile: ' + self.get_fit_function_file_name() + '\n')
-
-            self.results_textbox.append(self.fit.__str__())
-
-            if not self.checkBox_dy.isChecked():
-                self.results_textbox.append('\n\n***************\tdY NOT INCLUDED!\t***************\n\nALL CALCULATIONS USING CHI2 SHOULD BE TAKEN WITH A GRAIN OF SALT.\nWithout dY the formula taken for chi 2 is:\n\nchi2=sum[(y_i - y_fit)^2].\n')
-            if self.checkBox_xrange.isChecked():
-                self.results_textbox.append(f"X Range: {x_range}\n")
-
-            self.apply_partition()
-
-            self.pushButton_fitresults.show()
-
-            show()  # Show plotted graphs
+            x_range = self.get_x_range()
+
+            load_kwargs = self.get_load_kwargs(colorder, x_range)
+
+            p0 = [float(p) for p in init_params]
+
+            fit_kwargs = dict(colorder=colorder,
+                              p0=p0,
+                              func=self.fit_function,
+                              x_range=x_range,
+                              method=self.method,
+                              linear=self.fit_model.linear,
+                              **self.fit_model.derivatives(self.method, p0, self.checkBox_autojac.isChecked()))
+
+            # The x range and the removed points are not part of the key, refitting after changing them is the point
+            warm_key = (load_kwargs['path'], load_kwargs.get('sheet_name', 0), headers, tuple(colorder),
+                        self.lineEdit_pathmodel.text(), self.fit_model.digest, self.method)
+            if self.checkBox_warmstart.isChecked():
+                fit_kwargs['warm_start'] = self.warm_states.get(warm_key)
+
+            multi_start_kwargs = None
+            if self.checkBox_multistart.isChecked():
+                multi_start_kwargs = dict(bounds=self.get_bounds(),
+                                          model_path=self.lineEdit_pathmodel.text(),
+                                          n=self.spinBox_starts.value(),
+                                          processes=self.spinBox_processes.value(),
+                                          jit=self.checkBox_jit.isChecked(),
+                                          auto_jacobian=self.checkBox_autojac.isChecked())
+
+            # Everything the results depend on is read from the widgets now,
+            # the user may edit them while the fit is running
+            report = dict(title=self.lineEdit_fittitle.text(),
+                          xlabel=self.lineEdit_fitxlabel.text(),
+                          ylabel=self.lineEdit_fitylabel.text(),
+                          residuals_ylabel=self.lineEdit_resylabel.text(),
+                          plot_fit=self.checkBox_fit.isChecked(),
+                          plot_residuals=self.checkBox_residuals.isChecked(),
+                          plot_initial_guess=self.checkBox_initguess.isChecked(),
+                          model_file_name=self.get_fit_function_file_name(),
+                          model_path=self.lineEdit_pathmodel.text(),
+                          jit=self.checkBox_jit.isChecked(),
+                          auto_jacobian=self.checkBox_autojac.isChecked(),
+                          include_dy=self.checkBox_dy.isChecked(),
+                          x_range=x_range,
+                          data_path=load_kwargs['path'],
+                          sheet=load_kwargs.get('sheet_name', 0),
+                          warm_key=warm_key)
+
+            self.submit_fit(self.fit_number, load_kwargs, fit_kwargs, report, multi_start_kwargs)
 
         # except IndexError as e:
         #     self.popupmsg("Most common error:\n"
@@ -605,6 +766,443 @@ class FitGUI(QMainWindow):
                           '\n---------------------------------\n' +
                           '\nError Message:\n' + '\n' + str(e), 'error')
 
+    def get_colorder(self) -> List[Union[int, None]]:
+        """
+        return [x_col, dx_col, y_col, dy_col] as the Fit class expects it.
+        """
+        self.xcol = self.spinBox_xcol.value()
+        self.ycol = self.spinBox_ycol.value()
+
+        if self.checkBox_dy.isChecked():
+            self.dycol = self.spinBox_dycol.value()
+        else:
+            self.dycol = None
+
+        if self.method == 'odr':
+            self.dxcol = self.spinBox_dxcol.value()
+        else:
+            self.dxcol = None  # if method == 'ls' the Fit class doesn't even access colorder: List[int] [1] (the
+            # second entry in the colorder list)
+
+        self.check_identical_cols_nums()
+
+        return [self.xcol, self.dxcol, self.ycol, self.dycol]
+
+    def get_load_kwargs(self, colorder: List[Union[int, None]], x_range: Union[List[float], None]) -> dict:
+        """
+        return the keyword arguments of LoadData for the data file, sheet, columns and removed points of the window.
+        """
+        delpoints = self.checkBox_delpoints.isChecked()
+        points_to_remove: List[str] = self.lineEdit_listpoints.text().split(', ')
+        indices_to_remove = None
+        if delpoints:
+            indices_to_remove = [int(p) for p in points_to_remove]
+
+        data_file_ext = self.get_data_file_ext()
+
+        load_kwargs = dict(path=self.lineEdit_pathdata.text(),
+                           indices_to_remove=indices_to_remove,
+                           headers=self.checkBox_headers.isChecked(),
+                           delete_points=delpoints,
+                           columns=[col for col in colorder if col is not None])
+        if data_file_ext.endswith(excel_extensions + ('.h5', '.hdf5')):
+            load_kwargs['sheet_name'] = self.comboBox_sheets.currentText()
+
+        if data_file_ext == '.csv' and getsize(load_kwargs['path']) > stream_threshold:
+            load_kwargs.update(chunksize=stream_chunksize, x_range=x_range, x_column=self.xcol)
+        return load_kwargs
+
+    def get_x_range(self) -> Union[List[float], None]:
+        isxrange = self.checkBox_xrange.isChecked()
+        x_range = None
+        if isxrange:
+            x_range: List[str] = self.lineEdit_xrange.text().split(', ')
+            if len(x_range) > 2:
+                self.popupmsg("Only 2 items in x range!", "error")
+            x_range = [float(x) for x in x_range]
+        return x_range
+
+    def get_bounds(self) -> List[List[float]]:
+        """
+        return [[low, high], ...] of the parameters, the input is written as "low, high; low, high".
+        """
+        bounds = [[float(b) for b in bound.split(',')] for bound in self.lineEdit_bounds.text().split(';')]
+        if any(len(bound) != 2 for bound in bounds):
+            raise ValueError('Every parameter needs exactly 2 bounds: "low, high; low, high; ..."')
+        return bounds
+
+    def submit_fit(self, job_id: int, load_kwargs: dict, fit_kwargs: dict, report: dict,
+                   multi_start_kwargs: dict = None) -> None:
+        worker = FitWorker(job_id, load_kwargs, fit_kwargs, multi_start_kwargs)
+        worker.signals.progress.connect(self.fit_progress)
+        worker.signals.finished.connect(self.fit_finished)
+        worker.signals.error.connect(self.fit_error)
+        worker.signals.cancelled.connect(self.fit_cancelled)
+
+        self.jobs[job_id] = (worker, report)
+        self.update_progress()
+        self.thread_pool.start(worker)
+
+    def cancel_fits(self) -> None:
+        for worker, _ in self.jobs.values():
+            worker.cancel()
+        if self.bootstrap_worker is not None:
+            self.bootstrap_worker.cancel()
+        self.statusbar.showMessage('Cancelling...')
+
+    def fit_progress(self, job_id: int, stage: str) -> None:
+        self.statusbar.showMessage(f'Fit {job_id}: {stage}... ({len(self.jobs)} running)')
+
+    def fit_finished(self, job_id: int, fit) -> None:
+        _, report = self.jobs.pop(job_id)
+        self.update_progress()
+
+        try:
+            self.last_fit = fit
+            self.last_fit_number = job_id
+            self.fit_report = report
+
+            self.warm_states[report['warm_key']] = fit.warm_state()
+            self.results.append(FitResult.from_fit(fit, fit_num=job_id, model=report['model_path'], data=report['data_path'],
+                                                   sheet=report['sheet'], x_range=report['x_range']))
+
+            if report['plot_fit'] or report['plot_residuals'] or report['plot_initial_guess']:
+                self.plot_panel.show_fit(fit, report, job_id)
+                self.plot_dock.show()
+
+            self.apply_fit_number(job_id)
+
+            self.results_textbox.append('\nFile: ' + report['model_file_name'] + '\n')
+
+            self.results_textbox.append(fit.__str__())
+
+            if not report['include_dy']:
+                self.results_textbox.append('\n\n***************\tdY NOT INCLUDED!\t***************\n\nALL CALCULATIONS USING CHI2 SHOULD BE TAKEN WITH A GRAIN OF SALT.\nWithout dY the formula taken for chi 2 is:\n\nchi2=sum[(y_i - y_fit)^2].\n')
+            if report['x_range'] is not None:
+                self.results_textbox.append(f"X Range: {report['x_range']}\n")
+
+            self.apply_partition()
+
+            self.pushButton_fitresults.show()
+
+        except Exception as e:
+            self.fit_error(job_id, type(e).__name__, str(e))
+
+    def fit_error(self, job_id: int, error_type: str, message: str) -> None:
+        self.jobs.pop(job_id, None)
+        self.update_progress()
+        self.popupmsg(f'Fit {job_id}\n\nError Type:\n' + '\n' + error_type + '\n' +
+                      '\n---------------------------------\n' +
+                      '\nError Message:\n' + '\n' + message, 'error')
+
+    def fit_cancelled(self, job_id: int) -> None:
+        self.jobs.pop(job_id)
+        self.update_progress()
+        self.statusbar.showMessage(f'Fit {job_id} was cancelled', 5000)
+
+    def update_progress(self) -> None:
+        """
+        Show a busy progress bar and the cancel button as long as there are fits in the queue or a bootstrap runs.
+        """
+        if self.jobs or self.bootstrap_worker is not None:
+            self.progressBar_fit.setRange(0, 0)  # The solvers do not report their progress
+            self.progressBar_fit.show()
+            self.pushButton_cancel.show()
+        else:
+            self.progressBar_fit.hide()
+            self.pushButton_cancel.hide()
+            self.statusbar.clearMessage()
+
+    def bootstrap(self, mode: str) -> None:
+        """
+        Estimate the parameter uncertainties of the last fit by refitting it to resampled data, see Bootstrap.
+        """
+        try:
+            if self.last_fit is None:
+                raise ValueError('Run a fit first, the last fit is resampled')
+            if self.bootstrap_worker is not None:
+                raise ValueError('A bootstrap is already running')
+
+            title = 'Bootstrap' if mode == 'resample' else 'Monte Carlo'
+            n, ok = QInputDialog.getInt(self, title, 'Number of refits:', 1000, 10, 10 ** 7, 1000)
+            if not ok:
+                return
+
+            bootstrap_kwargs = dict(fit=self.last_fit,
+                                    model_path=self.fit_report['model_path'],
+                                    n=n,
+                                    mode=mode,
+                                    processes=self.spinBox_processes.value(),
+                                    jit=self.fit_report['jit'],
+                                    auto_jacobian=self.fit_report['auto_jacobian'])
+
+            self.bootstrap_worker = PoolWorker(self.last_fit_number, Bootstrap, bootstrap_kwargs)
+            self.bootstrap_worker.signals.progress.connect(
+                lambda job_id, progress: self.statusbar.showMessage(f'Fit {job_id}: {title} {progress}...'))
+            self.bootstrap_worker.signals.finished.connect(self.bootstrap_finished)
+            self.bootstrap_worker.signals.error.connect(self.bootstrap_error)
+            self.update_progress()
+            self.thread_pool.start(self.bootstrap_worker)
+
+        except Exception as e:
+            self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                          '\n---------------------------------\n' +
+                          '\nError Message:\n' + '\n' + str(e), 'error')
+
+    def bootstrap_finished(self, job_id: int, result) -> None:
+        self.bootstrap_worker = None
+        self.update_progress()
+
+        self.apply_fit_number(job_id)
+        self.results_textbox.append(result.__str__())
+        self.apply_partition()
+
+        self.pushButton_fitresults.show()
+        self.results_window.show()
+
+    def bootstrap_error(self, job_id: int, error_type: str, message: str) -> None:
+        self.bootstrap_worker = None
+        self.update_progress()
+        self.popupmsg(f'Fit {job_id}\n\nError Type:\n' + '\n' + error_type + '\n' +
+                      '\n---------------------------------\n' +
+                      '\nError Message:\n' + '\n' + message, 'error')
+
+    def scan(self) -> None:
+        """
+        Plot the chi squared of the last fit over 1 parameter, or the chi squared contours of 2 parameters.
+        """
+        try:
+            if self.last_fit is None:
+                raise ValueError('Run a fit first, the last fit is scanned')
+
+            text, ok = QInputDialog.getText(self, 'Chi2 Scan', 'Parameters to scan (e.g "0" or "0, 1"):', text='0, 1')
+            if not ok:
+                return
+            indices = [int(i) for i in text.split(',')]
+            if len(indices) not in (1, 2) or len(set(indices)) != len(indices):
+                raise ValueError('Scan 1 or 2 different parameters')
+
+            items = ['Fixed at the best fit', 'Profiled (refitted at every point)']
+            item, ok = QInputDialog.getItem(self, 'Chi2 Scan', 'The other parameters are:', items, 0, False)
+            if not ok:
+                return
+
+            scan_kwargs = dict(indices=indices,
+                               values=[self.last_fit.scan_values(i, npoints=41 if len(indices) == 2 else 101) for i in indices],
+                               profile=item == items[1],
+                               model_path=self.fit_report['model_path'],
+                               jit=self.fit_report['jit'],
+                               processes=self.spinBox_processes.value())
+
+            worker = ScanWorker(self.last_fit_number, self.last_fit, scan_kwargs)
+            worker.signals.finished.connect(self.scan_finished)
+            worker.signals.error.connect(self.scan_error)
+            self.statusbar.showMessage(f'Fit {self.last_fit_number}: Chi2 Scan...')
+            self.thread_pool.start(worker)
+
+        except Exception as e:
+            self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                          '\n---------------------------------\n' +
+                          '\nError Message:\n' + '\n' + str(e), 'error')
+
+    def scan_finished(self, job_id: int, result) -> None:
+        self.statusbar.clearMessage()
+        fit, indices, values, chi2 = result  # The scanned fit, a later fit may have finished in the meantime
+        try:
+            fit.plot_scan(indices, values, chi2, job_id)
+            self.close_old_figures()
+            show(block=False)
+        except Exception as e:
+            self.scan_error(job_id, type(e).__name__, str(e))
+
+    def scan_error(self, job_id: int, error_type: str, message: str) -> None:
+        self.statusbar.clearMessage()
+        self.popupmsg(f'Fit {job_id}\n\nError Type:\n' + '\n' + error_type + '\n' +
+                      '\n---------------------------------\n' +
+                      '\nError Message:\n' + '\n' + message, 'error')
+
+    def export_figures(self) -> None:
+        """
+        Save the plots of the last fit to image files, rendered in the background, see export_figures.
+        """
+        try:
+            if self.last_fit is None:
+                raise ValueError('Run a fit first, the figures of the last fit are exported')
+
+            directory = QFileDialog.getExistingDirectory(self, 'Export Figures To', self.default_data_path or '')
+            if directory == '':
+                return
+            fmt, ok = QInputDialog.getItem(self, 'Export Figures', 'Format:', list(figure_formats), 0, False)
+            if not ok:
+                return
+
+            report = dict(self.fit_report, plot_fit=True, plot_residuals=True, plot_initial_guess=True)
+            figures = fit_figures(report, directory, f'Fit {self.last_fit_number}', fmt, fit_num=self.last_fit_number)
+            export_kwargs = dict(exports=[(self.last_fit, report['model_path'], figures)],
+                                 jit=report['jit'],
+                                 processes=self.spinBox_processes.value())
+
+            worker = PoolWorker(self.last_fit_number, export_figures, export_kwargs)
+            worker.signals.finished.connect(self.export_finished)
+            worker.signals.error.connect(self.export_error)
+            self.statusbar.showMessage(f'Fit {self.last_fit_number}: Exporting figures...')
+            self.thread_pool.start(worker)
+
+        except Exception as e:
+            self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                          '\n---------------------------------\n' +
+                          '\nError Message:\n' + '\n' + str(e), 'error')
+
+    def export_finished(self, job_id: int, paths: List[str]) -> None:
+        self.statusbar.showMessage(f'Fit {job_id}: {len(paths)} figures were saved', 5000)
+
+    def export_error(self, job_id: int, error_type: str, message: str) -> None:
+        self.statusbar.clearMessage()
+        self.popupmsg(f'Fit {job_id}\n\nError Type:\n' + '\n' + error_type + '\n' +
+                      '\n---------------------------------\n' +
+                      '\nError Message:\n' + '\n' + message, 'error')
+
+    def preview_guess(self) -> None:
+        """
+        Load the data and the model of the window into the preview, then show the curve of the initial parameters.
+        """
+        try:
+            if self.lineEdit_pathdata.text() == '' or self.lineEdit_pathmodel.text() == '':
+                raise ValueError('Choose a data file and a model file first')
+
+            self.method = self.get_method()
+            self.load_fit_function()
+            colorder = self.get_colorder()
+            x_range = self.get_x_range()
+
+            # The data is loaded on the thread pool, the preview opens once it is loaded
+            self.preview_number += 1
+            self.preview_model = (self.fit_function, self.method)
+            worker = DataWorker(self.preview_number, self.get_load_kwargs(colorder, x_range), colorder, x_range)
+            worker.signals.finished.connect(self.preview_loaded)
+            worker.signals.error.connect(self.preview_error)
+            self.statusbar.showMessage('Initial Guess Preview: Loading data...')
+            self.thread_pool.start(worker)
+
+        except Exception as e:
+            self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                          '\n---------------------------------\n' +
+                          '\nError Message:\n' + '\n' + str(e), 'error')
+
+    def preview_loaded(self, job_id: int, columns: list) -> None:
+        if job_id != self.preview_number:  # Reloaded in the meantime
+            return
+        self.statusbar.clearMessage()
+        try:
+            self.guess_preview.set_data(*columns, *self.preview_model)
+            self.preview_window.show()
+            self.preview_params_edited(self.lineEdit_params.text())
+        except Exception as e:
+            self.preview_error(job_id, type(e).__name__, str(e))
+
+    def preview_error(self, job_id: int, error_type: str, message: str) -> None:
+        if job_id != self.preview_number:
+            return
+        self.statusbar.clearMessage()
+        self.popupmsg('Error Type:\n' + '\n' + error_type + '\n' +
+                      '\n---------------------------------\n' +
+                      '\nError Message:\n' + '\n' + message, 'error')
+
+    def preview_params_edited(self, text: str) -> None:
+        if not self.preview_window.isVisible():
+            return
+        try:
+            params = [float(p) for p in text.split(',')]
+        except ValueError:  # The user is still typing
+            return
+        self.guess_preview.set_params(params)
+
+    def close_old_figures(self) -> None:
+        """
+        Close the oldest pyplot figures, so at most max_figures of them are open.
+        """
+        for num in get_fignums()[:-max_figures]:
+            close(num)
+
+    def browsebatchdir(self) -> None:
+        directory = QFileDialog.getExistingDirectory(self.batch_window, 'Choose Directory', self.default_data_path)
+        if directory != '':
+            self.lineEdit_batchfiles.setText(directory)
+
+    def batch_fit(self) -> None:
+        try:
+            if self.lineEdit_pathmodel.text() == '' or self.lineEdit_params.text() == '':
+                raise ValueError('The model file and the initial parameters are taken from the main window')
+
+            self.method = self.get_method()
+
+            datasets = batch_datasets(self.lineEdit_batchfiles.text(), self.checkBox_allsheets.isChecked())
+            if not datasets:
+                raise ValueError(f'No data files match "{self.lineEdit_batchfiles.text()}"')
+
+            batch_kwargs = dict(datasets=datasets,
+                                model_path=self.lineEdit_pathmodel.text(),
+                                colorder=self.get_colorder(),
+                                p0=[float(p) for p in self.lineEdit_params.text().split(', ')],
+                                x_range=self.get_x_range(),
+                                method=self.method,
+                                headers=self.checkBox_headers.isChecked(),
+                                processes=self.spinBox_processes.value(),
+                                auto_jacobian=self.checkBox_autojac.isChecked(),
+                                jit=self.checkBox_jit.isChecked())
+
+            self.batch_worker = PoolWorker(0, batch_fit, batch_kwargs)
+            self.batch_worker.signals.progress.connect(self.batch_progress)
+            self.batch_worker.signals.finished.connect(self.batch_finished)
+            self.batch_worker.signals.error.connect(self.batch_error)
+            self.pushButton_batchcancel.clicked.connect(self.batch_worker.cancel)
+
+            self.progressBar_batch.setRange(0, len(datasets))
+            self.progressBar_batch.setValue(0)
+            self.pushButton_batchrun.setEnabled(False)
+            self.pushButton_batchcancel.setEnabled(True)
+
+            self.thread_pool.start(self.batch_worker)
+
+        except Exception as e:
+            self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                          '\n---------------------------------\n' +
+                          '\nError Message:\n' + '\n' + str(e), 'error')
+
+    def batch_progress(self, job_id: int, progress: str) -> None:
+        self.progressBar_batch.setValue(int(progress.split('/')[0]))
+
+    def batch_finished(self, job_id: int, table) -> None:
+        self.batch_done()
+        self.batch_table = table
+
+        self.table_batch.setRowCount(len(table))
+        self.table_batch.setColumnCount(len(table.columns))
+        self.table_batch.setHorizontalHeaderLabels([str(col) for col in table.columns])
+        self.table_batch.setVerticalHeaderLabels([f'{path.split("/")[-1]} [{sheet}]' for path, sheet in table.index])
+        for i, row in enumerate(table.itertuples(index=False)):
+            for j, value in enumerate(row):
+                self.table_batch.setItem(i, j, QTableWidgetItem(f'{value:.6g}' if isinstance(value, float) else str(value)))
+
+        self.pushButton_batchsave.setEnabled(True)
+
+    def batch_error(self, job_id: int, error_type: str, message: str) -> None:
+        self.batch_done()
+        self.popupmsg('Error Type:\n' + '\n' + error_type + '\n' +
+                      '\n---------------------------------\n' +
+                      '\nError Message:\n' + '\n' + message, 'error')
+
+    def batch_done(self) -> None:
+        self.pushButton_batchcancel.clicked.disconnect()
+        self.pushButton_batchcancel.setEnabled(False)
+        self.pushButton_batchrun.setEnabled(True)
+
+    def save_batch_csv(self) -> None:
+        path = QFileDialog.getSaveFileName(self.batch_window, 'Save File', 'Data/batch_results.csv', 'CSV (*.csv)')
+        if path[0] != '':
+            self.batch_table.to_csv(path[0])
+            self.popupmsg('Results were saved successfully!', 'notice')
+
     def apply_fit_number(self, n) -> None:
         string = f'Fit Number {n}:\n'
         self.results_textbox.append(string)
@@ -622,9 +1220,45 @@ class FitGUI(QMainWindow):
                 f.write(self.results_textbox.toPlainText())
             self.popupmsg('Results were saved successfully!', 'notice')
 
+    def save_history(self) -> None:
+        path = QFileDialog.getSaveFileName(self, 'Save File', 'Data/fit_results.npz',
+                                           'NumPy (*.npz);;JSON (*.json);;Parquet (*.parquet)')
+        if path[0] != '':
+            try:
+                save_results(self.results, path[0])
+                self.popupmsg('Results were saved successfully!', 'notice')
+            except Exception as e:
+                self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                              '\n---------------------------------\n' +
+                              '\nError Message:\n' + '\n' + str(e), 'error')
+
+    def load_history(self) -> None:
+        """
+        Add the results of a table which save_history saved to the history, without fitting again.
+        """
+        path = QFileDialog.getOpenFileName(self, 'Open File', 'Data', 'Results (*.npz *.json *.parquet)')
+        if path[0] != '':
+            try:
+                results = load_results(path[0])
+            except Exception as e:
+                self.popupmsg('Error Type:\n' + '\n' + type(e).__name__ + '\n' +
+                              '\n---------------------------------\n' +
+                              '\nError Message:\n' + '\n' + str(e), 'error')
+                return
+
+            self.results += results
+            self.results_textbox.append(f'Loaded {len(results)} results from {path[0]}\n')
+            for result in results:
+                self.apply_fit_number(result.metadata.get('fit_num', '(loaded)'))
+                self.results_textbox.append(result.__str__())
+                self.apply_partition()
+            self.pushButton_fitresults.show()
+
     def clear_history(self) -> None:
         self.results_textbox.clear()
         self.fit_number = 0
+        self.warm_states.clear()
+        self.results.clear()
 
     def get_fit_function_file_name(self) -> str:
         return self.lineEdit_pathmodel.text().split('/')[-1]
@@ -655,16 +1289,19 @@ class FitGUI(QMainWindow):
         fname = QFileDialog.getOpenFileName(self,
                                             'Open File',
                                             self.default_data_path,
-                                            'CSV Files (*.csv);;Excel Files (*.xlsx *.xls *.xlsm *.xlsb *.odf *.ods *.odt)'
+                                            'CSV Files (*.csv);;Excel Files (*.xlsx *.xls *.xlsm *.xlsb *.odf *.ods *.odt);;'
+                                            'Binary Files (*.npy *.h5 *.hdf5)'
                                             )
 
         self.data_fname = fname[0]
 
         self.sheets = 0  # the default sheet number that pandas take is 0
-        if self.data_fname.endswith(('.xlsx', '.xlsm')):
+        if self.data_fname.endswith(excel_extensions + ('.h5', '.hdf5')):
 
-            wb = load_workbook(self.data_fname, read_only=True)
-            sheets = wb.sheetnames
+            if self.data_fname.endswith(('.h5', '.hdf5')):
+                sheets = hdf5_datasets(self.data_fname)
+            else:
+                sheets = sheet_names(self.data_fname)
 
             self.comboBox_sheets.clear()  # Incase a xlsx file is loaded one after another
             self.comboBox_sheets.addItems(sheets)
@@ -712,8 +1349,8 @@ class FitGUI(QMainWindow):
         self.popupmsg('Path was saved successfully!', 'notice')
 
     def load_fit_function(self) -> None:
-        module = import_source_file(self.lineEdit_pathmodel.text(), 'fit_function')
-        self.fit_function = module.fit_function
+        self.fit_model = load_model(self.lineEdit_pathmodel.text(), self.checkBox_jit.isChecked())
+        self.fit_function = self.fit_model.fit_function
 
     def check_identical_cols_nums(self) -> None:
         if self.method == 'ls':
@@ -0,0 +1,67 @@
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Callable, Union
+
+# Compiled models are cached under this directory, one sub directory per model script content
+cache_dir = os.environ.get('FITGUI_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'fitgui'))
+
+
+def cached_source(fname: Union[str, Path]) -> str:
+    """
+    Copy a model script to '<cache_dir>/jit/<content digest>/model.py' and return the copy's path.
+
+    Numba keeps its on-disk cache next to the source file of the compiled function and keys it by that file.
+    Compiling the copy therefore keys the compiled artifact by the script's content: an edited script is compiled
+    again, while the same script reuses its compiled code in every session, wherever it is loaded from.
+    """
+    with open(fname, 'rb') as f:
+        digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+    directory = os.path.join(cache_dir, 'jit', digest)
+    path = os.path.join(directory, 'model.py')
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = path + f'.{os.getpid()}.tmp'
+        shutil.copyfile(fname, tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+class JitFunction:
+    """
+    A fit function compiled by Numba, which falls back to the plain Python function if Numba can not compile it.
+
+    Numba compiles lazily on the first call for every new combination of argument types,
+    hence the fallback happens on the first call which Numba fails to compile.
+    """
+
+    def __init__(self, func: Callable):
+        import numba  # Optional dependency, only needed for JIT compilation
+
+        self.python_function = func
+        self.compiled_function = numba.njit(cache=True)(func)
+        self.errors = numba.core.errors.NumbaError
+        self.failed = False
+
+        self.__name__ = func.__name__
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args):
+        if not self.failed:
+            try:
+                return self.compiled_function(*args)
+            except self.errors:
+                self.failed = True
+        return self.python_function(*args)
+
+
+def jit_compile(func: Callable) -> Callable:
+    """
+    Compile a fit function with Numba, or return it as is if Numba is not installed.
+    """
+    try:
+        return JitFunction(func)
+    except ImportError:
+        return func
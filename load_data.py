@@ -1,5 +1,113 @@
+import numpy as np
 import pandas as pd
-from typing import List, Union
+import os
+import zipfile
+from xml.etree import ElementTree
+from collections import OrderedDict
+from contextlib import contextmanager
+from threading import Lock
+from typing import Iterator, List, Union
+from data_cache import DataCache, SidecarCache
+
+# Parsed arrays shared by every LoadData instance, so refitting the same file does not parse it again
+cache = DataCache()
+# Parsed arrays saved next to the data files, so a new session does not parse them again
+disk_cache = SidecarCache()
+
+hdf5_extensions = ('.h5', '.hdf5')
+binary_extensions = ('.npy',) + hdf5_extensions
+excel_extensions = ('xlsx', 'xls', 'xlsm', 'xlsb', 'odf', 'ods', 'odt')
+
+# Open workbooks, so loading several sheets (or the same sheet with other options) opens the workbook only once
+excel_files = OrderedDict()  # absolute path -> OpenWorkbook
+excel_files_lock = Lock()  # Guards excel_files only, every workbook has a lock of its own for parsing
+max_excel_files = 4
+
+
+class OpenWorkbook:
+    """
+    A cached workbook. An open workbook can not be read by two threads at once, so it is only used under its lock,
+    workbooks of different files are parsed concurrently.
+    """
+    __slots__ = ('stamp', 'handle', 'lock')
+
+    def __init__(self, stamp: tuple):
+        self.stamp = stamp  # (modification time, size) of the file when it was opened
+        self.handle = None  # Opened by the first thread which uses it, under lock
+        self.lock = Lock()
+
+    def close(self) -> None:
+        with self.lock:
+            if self.handle is not None:
+                self.handle.close()
+                self.handle = None
+
+
+@contextmanager
+def excel_file(path: str) -> Iterator[pd.ExcelFile]:
+    """
+    The open workbook of path, opened again only if the file changed since it was last opened.
+    The calling thread holds the workbook for the duration of the with block.
+    """
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+
+    evicted = []
+    with excel_files_lock:
+        workbook = excel_files.pop(key, None)
+        if workbook is not None and workbook.stamp != stamp:
+            evicted.append(workbook)
+            workbook = None
+        if workbook is None:
+            workbook = OpenWorkbook(stamp)
+        excel_files[key] = workbook
+        while len(excel_files) > max_excel_files:
+            evicted.append(excel_files.popitem(last=False)[1])
+
+    for old in evicted:  # Waits for the threads which are reading them, but not under excel_files_lock
+        old.close()
+
+    with workbook.lock:
+        if workbook.handle is None:  # New, or closed by an eviction while this thread waited for it
+            workbook.handle = pd.ExcelFile(path)
+        try:
+            yield workbook.handle
+        finally:
+            with excel_files_lock:
+                cached = excel_files.get(key) is workbook
+            if not cached:  # Evicted in the meantime, nobody else closes it
+                workbook.handle.close()
+                workbook.handle = None
+
+
+def sheet_names(path: str) -> List[str]:
+    """
+    Names of the sheets of a workbook.
+
+    xlsx/xlsm files are zip archives, the names are read from the workbook index (xl/workbook.xml)
+    without loading the shared strings, the styles or any worksheet.
+    Other formats are opened with pandas, the open workbook is then reused by LoadData.
+    """
+    if path.endswith(('.xlsx', '.xlsm')):
+        with zipfile.ZipFile(path) as archive:
+            root = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        return [sheet.get('name') for sheet in root.iter() if sheet.tag.endswith('}sheet')]
+
+    with excel_file(path) as workbook:
+        return workbook.sheet_names
+
+
+def hdf5_datasets(path: str) -> List[str]:
+    """
+    Names of every dataset inside an HDF5 file, in the order in which sheet_name indexes them.
+    """
+    import h5py  # Optional dependency, only needed for HDF5 files
+
+    names = []
+    with h5py.File(path, 'r') as f:
+        f.visititems(lambda name, obj: names.append(name) if isinstance(obj, h5py.Dataset) else None)
+    return names
 
 
 class LoadData:
@@ -9,7 +117,14 @@ class LoadData:
                  indices_to_remove: List[int] = None,
                  headers: bool = True,
                  delete_points: bool = False,
-                 sheet_name=0
+                 sheet_name=0,
+                 columns: List[int] = None,
+                 chunksize: int = None,
+                 x_range: Union[List[float], None] = None,
+                 x_column: int = None,
+                 decimate: int = 1,
+                 use_cache: bool = True,
+                 use_disk_cache: bool = True
                  ):
         """
         sheet_namestr: int, list, or None, default 0
@@ -26,6 +141,35 @@ class LoadData:
         * [0, 1, "Sheet5"]: Load first, second and sheet named “Sheet5” as a dict of DataFrame
 
         * None: All worksheets.
+
+        For HDF5 files sheet_name is the name of the dataset, or its position in hdf5_datasets.
+
+        Binary files (.npy, HDF5) already hold numbers, they are memory mapped instead of parsed whenever possible
+        and columns are picked out of them as views by Fit. Hence, for these files self.data keeps the file's column
+        layout (columns is ignored) and they are not cached.
+
+        indices_to_remove: the points to remove if delete_points is True, 0 indexed from the first data row in every
+        file type (the header row does not count).
+
+        columns: the (0 indexed) columns to load, None loads every column as is.
+        Only these columns are parsed, straight into a float64 array whose i'th column is columns[i].
+        The array is in Fortran order so every column is contiguous, use colorder to translate column numbers.
+
+        chunksize: stream a CSV file this many rows at a time instead of reading it at once.
+        Only the rows which survive the x range filter and the decimation of every chunk are kept,
+        so the peak memory does not depend on the size of the file.
+
+        x_range: [low, high], keep only the rows whose x (the x_column of the file) is inside the range.
+        Only applied when streaming, Fit applies the x range itself otherwise.
+
+        decimate: keep every decimate'th of the surviving rows. Only applied when streaming.
+
+        use_cache: reuse the array parsed by a previous LoadData of the same file with the same options.
+        The file's modification time and size are part of the cache key, so an edited file is parsed again.
+
+        use_disk_cache: reuse (memory map) the array parsed in a previous session, see SidecarCache.
+        Streamed loads and loads with removed points are not persisted, every x range, decimation or set of points
+        would leave another array behind and hashing a huge streamed file costs about as much as streaming it.
         """
 
         self.path = path
@@ -44,9 +188,159 @@ class LoadData:
         else:
             self.points_to_remove = None
 
+        self.sheet_name = sheet_name
+
+        self.columns = None if columns is None else list(columns)
+
+        self.chunksize = chunksize
+        if self.chunksize is not None:
+            if x_range is not None and x_column is None:
+                raise ValueError('x_column must be provided in order to filter an x range while streaming.')
+            if decimate < 1:
+                raise ValueError(f'decimate must be a positive integer, {decimate} was provided.')
+            self.x_range = None if x_range is None else tuple(x_range)
+            self.x_column = x_column
+            self.decimate = decimate
+
+        if self.path.endswith(binary_extensions):
+            self.columns = None
+            self.data = self.read_binary()
+            return
+
+        key = None
+        if use_cache:
+            key = self.cache_key()
+            self.data = cache.get(key)
+            if self.data is not None:
+                return
+
+        self.data = None
+        use_disk_cache = use_disk_cache and self.chunksize is None and self.points_to_remove is None
+        if use_disk_cache:
+            self.data = disk_cache.get(self.path, self.options())
+
+        if self.data is None:
+            self.data = self.read()
+            if use_disk_cache:
+                disk_cache.put(self.path, self.options(), self.data)
+
+        if key is not None:
+            cache.put(key, self.data)
+
+    def options(self) -> tuple:
+        """
+        The parsing options, different options produce different arrays from the same file.
+        """
+        points_to_remove = None if self.points_to_remove is None else tuple(self.points_to_remove)
+        columns = None if self.columns is None else tuple(self.columns)
+        options = self.sheet_name, self.headers, points_to_remove, columns
+        if self.chunksize is not None:  # The chunk size itself does not change the result
+            options += self.x_range, self.x_column, self.decimate
+        return options
+
+    def colorder(self, colorder: List[Union[int, None]]) -> List[Union[int, None]]:
+        """
+        Translate column numbers of the data file to column numbers of self.data, None entries are kept.
+        """
+        if self.columns is None:
+            return list(colorder)
+        return [None if col is None else self.columns.index(col) for col in colorder]
+
+    def skiprows(self) -> Union[List[int], None]:
+        """
+        The file rows of the points to remove. Points are numbered from 0 at the first data row, as the rows of
+        a binary file, while pandas counts the rows of the file, the header row included.
+        """
+        if self.points_to_remove is None:
+            return None
+        offset = 0 if self.headers is None else 1
+        return [point + offset for point in self.points_to_remove]
+
+    def cache_key(self) -> tuple:
+        stat = os.stat(self.path)
+        return (os.path.abspath(self.path), stat.st_mtime_ns, stat.st_size) + self.options()
+
+    def read(self) -> np.ndarray:
+        usecols = None if self.columns is None else sorted(set(self.columns))
+
+        if self.chunksize is not None:
+            return self.read_chunks(usecols)
+
         if self.path.endswith('.csv'):
-            self.data = pd.read_csv(self.path, header=self.headers, skiprows=self.points_to_remove).to_numpy()
-        elif self.path.endswith(('xlsx', 'xls', 'xlsm', 'xlsb', 'odf', 'ods', 'odt')):
-            self.data = pd.read_excel(self.path, sheet_name=sheet_name, header=self.headers, skiprows=self.points_to_remove).to_numpy()
+            df = pd.read_csv(self.path, header=self.headers, skiprows=self.skiprows(), usecols=usecols)
+        elif self.path.endswith(excel_extensions):
+            with excel_file(self.path) as workbook:
+                df = pd.read_excel(workbook, sheet_name=self.sheet_name, header=self.headers, skiprows=self.skiprows(), usecols=usecols)
         else:
             raise TypeError('File type not supported yet.')
+
+        if self.columns is None:
+            return df.to_numpy()
+
+        # usecols keeps the file's column order, reorder to the requested one
+        return np.asfortranarray(df.iloc[:, [usecols.index(col) for col in self.columns]].to_numpy(dtype=np.float64))
+
+    def read_binary(self) -> np.ndarray:
+        if self.path.endswith('.npy'):
+            data = np.load(self.path, mmap_mode='r')
+        else:
+            data = self.read_hdf5()
+
+        if data.ndim == 1:  # A single column
+            data = data[:, np.newaxis]
+
+        if self.points_to_remove is not None:  # The only case in which the array is copied
+            data = np.delete(data, self.points_to_remove, axis=0)
+
+        return data
+
+    def read_hdf5(self) -> np.ndarray:
+        import h5py  # Optional dependency, only needed for HDF5 files
+
+        name = self.sheet_name
+        if isinstance(name, int):
+            name = hdf5_datasets(self.path)[name]
+
+        with h5py.File(self.path, 'r') as f:
+            dataset = f[name]
+            offset = dataset.id.get_offset()
+            # A contiguous, uncompressed dataset is stored as a plain array inside the file and can be memory mapped
+            if dataset.chunks is None and dataset.compression is None and offset is not None:
+                dtype, shape = dataset.dtype, dataset.shape
+            else:
+                return dataset[()]
+
+        return np.memmap(self.path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+    def read_chunks(self, usecols: Union[List[int], None]) -> np.ndarray:
+        if not self.path.endswith('.csv'):
+            raise TypeError('Only CSV files can be streamed.')
+
+        if self.x_range is not None:
+            x_index = self.x_column if self.columns is None else self.columns.index(self.x_column)
+            if self.x_range[0] >= self.x_range[1]:
+                raise ValueError("low <= high. First is low and second is high")
+
+        chunks = []
+        nsurvived = 0  # Rows which survived the x range so far, the decimation continues across chunks
+        for df in pd.read_csv(self.path, header=self.headers, skiprows=self.skiprows(), usecols=usecols, chunksize=self.chunksize):
+            if self.columns is None:
+                chunk = df.to_numpy()
+            else:
+                chunk = df.iloc[:, [usecols.index(col) for col in self.columns]].to_numpy(dtype=np.float64)
+
+            if self.x_range is not None:
+                x = chunk[:, x_index].astype(np.float64)
+                chunk = chunk[(self.x_range[0] <= x) & (x <= self.x_range[1])]
+
+            if self.decimate > 1:
+                start = -nsurvived % self.decimate
+                nsurvived += len(chunk)
+                chunk = chunk[start::self.decimate]
+
+            chunks.append(chunk)
+
+        data = np.concatenate(chunks)
+        if self.columns is None:
+            return data
+        return np.asfortranarray(data)
@@ -0,0 +1,141 @@
+import importlib.util
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, List, Union
+from autodiff import derive_jacobians
+from jit import cached_source, jit_compile
+
+if TYPE_CHECKING:
+    import types
+
+# Imported model scripts, keyed by (absolute path, jit): (modification time, size, content digest, module, FitModel)
+models = OrderedDict()
+models_lock = Lock()
+max_models = 32
+
+
+def import_source_file(fname: Union[str, Path], modname: str) -> "types.ModuleType":
+    """
+     Import a Python source file and return the loaded module.
+
+     Args:
+         fname: The full path to the source file.  It may container characters like `.`
+             or `-`.
+         modname: The name for the loaded module.  It may contain `.` and even characters
+             that would normally not be allowed (e.g., `-`).
+     Return:
+         The imported module
+
+     Raises:
+         ImportError: If the file cannot be imported (e.g, if it's not a `.py` file or if
+             it does not exist).
+         Exception: Any exception that is raised while executing the module (e.g.,
+             :exc:`SyntaxError).  These are errors made by the author of the module!
+     """
+    # https://docs.python.org/3/library/importlib.html#importing-a-source-file-directly
+    spec = importlib.util.spec_from_file_location(modname, fname)
+    if spec is None:
+        raise ImportError(f"Could not load spec for module '{modname}' at: {fname}")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[modname] = module
+    try:
+        spec.loader.exec_module(module)
+    except FileNotFoundError as e:
+        raise ImportError(f"{e.strerror}: {fname}") from e
+    return module
+
+
+class FitModel:
+    """
+    The functions which a model script defines.
+
+    Only "fit_function" is mandatory. Optionally, a script may define the exact derivatives of "fit_function",
+    which spare the solvers the finite differences:
+
+    * Least Squares: "jacobian(x, a, b, ...)" which returns the (n, p) array of d fit_function/d params.
+    * ODR: both "fjacb(a, x)", the (p, n) array of d fit_function/d params,
+      and "fjacd(a, x)", the (n,) array of d fit_function/d x.
+
+    Otherwise the derivatives can be derived from "fit_function" by automatic differentiation, see autodiff.
+
+    A script may also declare "linear = True" if "fit_function" is linear in its parameters (e.g a polynomial),
+    which lets Least Squares solve it directly (see Fit.linear_design). None (the default) always fits iteratively.
+
+    If jit is True "fit_function" is compiled by Numba (see jit), python_function is always the function as written.
+    digest is the content digest of the script, which changes whenever the script is edited.
+    """
+
+    def __init__(self, module: "types.ModuleType", jit: bool = False, digest: str = None):
+        self.path = module.__file__
+        self.digest = digest
+        self.python_function = module.fit_function
+        self.fit_function = jit_compile(module.fit_function) if jit else module.fit_function
+        self.jacobian = getattr(module, 'jacobian', None)
+        self.fjacb = getattr(module, 'fjacb', None)
+        self.fjacd = getattr(module, 'fjacd', None)
+        self.linear = getattr(module, 'linear', None)
+
+    def derivatives(self, method: str, p0: List[float] = None, auto: bool = False) -> dict:
+        """
+        The keyword arguments of Fit which hand the derivatives of the given method to the solver.
+
+        If auto is True and the script does not define the derivatives, they are derived from "fit_function" (at p0).
+        Models which can not be differentiated automatically fall back to finite differences.
+        """
+        if method == 'odr':
+            derivatives = dict(fjacb=self.fjacb, fjacd=self.fjacd)
+        else:
+            derivatives = dict(jacobian=self.jacobian)
+
+        if auto and None in derivatives.values():
+            derivatives.update(derive_jacobians(self.python_function, method, p0))  # Numba can not trace Duals
+        return derivatives
+
+
+def script_digest(fname: str) -> str:
+    with open(fname, 'rb') as f:
+        return hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+
+
+def load_model(fname: Union[str, Path], jit: bool = False) -> FitModel:
+    """
+    Import a model script, see FitModel.
+
+    Scripts are imported once and cached. A script is executed again only if its content changed,
+    a script whose modification time changed is hashed again so merely touching it does not reload it.
+    Every script is registered in sys.modules under a name of its own, the least recently used scripts are
+    removed from the cache and from sys.modules.
+
+    With jit the script is imported from its copy in the JIT cache, so Numba caches the compiled code by content.
+    """
+    path = os.path.abspath(fname)
+    stat = os.stat(path)
+
+    with models_lock:
+        cached = models.get((path, jit))
+        if cached is not None:
+            mtime_ns, size, digest, module, model = cached
+            if (mtime_ns, size) == (stat.st_mtime_ns, stat.st_size):
+                models.move_to_end((path, jit))
+                return model
+            if size == stat.st_size and digest == script_digest(path):
+                models[path, jit] = (stat.st_mtime_ns, size, digest, module, model)
+                models.move_to_end((path, jit))
+                return model
+
+        digest = script_digest(path)
+        modname = f"fit_function_{hashlib.blake2b(path.encode(), digest_size=8).hexdigest()}{'_jit' if jit else ''}"
+        module = import_source_file(cached_source(path) if jit else path, modname)  # Replaces the older version in sys.modules
+        model = FitModel(module, jit, digest)
+
+        models[path, jit] = (stat.st_mtime_ns, stat.st_size, digest, module, model)
+        models.move_to_end((path, jit))
+        while len(models) > max_models:
+            _, (_, _, _, evicted, _) = models.popitem(last=False)
+            sys.modules.pop(evicted.__name__, None)
+
+    return model
@@ -0,0 +1,147 @@
+import numpy as np
+from os import cpu_count
+from typing import Callable, List, Union
+from model_loader import load_model
+from pool import run_pool
+from fit import Fit
+
+
+def latin_hypercube(bounds: np.ndarray, n: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    n points inside the (p, 2) [low, high] bounds, exactly one point in each of the n slices of every parameter.
+    """
+    nparams = len(bounds)
+    slices = np.column_stack([rng.permutation(n) for _ in range(nparams)])
+    unit = (slices + rng.random((n, nparams))) / n
+    return bounds[:, 0] + unit * (bounds[:, 1] - bounds[:, 0])
+
+
+def multi_start_chunk(data: np.ndarray,
+                      colorder: List[Union[int, None]],
+                      x_range: Union[List[float], None],
+                      starts: np.ndarray,
+                      method: str,
+                      model_path: str,
+                      jit: bool,
+                      auto_jacobian: bool
+                      ) -> tuple:
+    """
+    Run a local fit from every start and return their (k, p) parameters and (k,) chi2, NaN for a failed fit.
+    """
+    model = load_model(model_path, jit)
+
+    ep = np.full(starts.shape, np.nan)
+    chi2 = np.full(len(starts), np.nan)
+    for i, p0 in enumerate(starts):
+        try:
+            with np.errstate(all='ignore'):
+                fit = Fit(data, colorder, p0, model.fit_function, x_range, method, linear=model.linear,
+                          **model.derivatives(method, p0, auto_jacobian))
+            ep[i], chi2[i] = fit.ep, fit.chi2
+        except Exception:  # e.g curve_fit did not converge from this start
+            pass
+    return ep, chi2
+
+
+class MultiStart:
+    """
+    A global search for the best fit: local fits from many starting points spread inside the parameter bounds.
+
+    The starts are a Latin hypercube sample of the bounds (plus p0, if given) and the local fits run on a process pool.
+    fit is the best solution (the lowest chi2) as a regular Fit, the other solutions describe how the minima are spread.
+    """
+
+    def __init__(self,
+                 data: np.ndarray,
+                 colorder: List[Union[int, None]],
+                 bounds: Union[List[List[float]], np.ndarray],
+                 model_path: str,
+                 x_range: Union[List[float], None] = None,
+                 method: str = 'odr',
+                 n: int = 32,
+                 p0: Union[List[float], None] = None,
+                 seed: Union[int, None] = None,
+                 processes: int = None,
+                 jit: bool = False,
+                 auto_jacobian: bool = False,
+                 callback: Callable[[int, int], None] = None,
+                 is_cancelled: Callable[[], bool] = None):
+        """
+        :param data: and colorder, x_range, method as in Fit
+        :param bounds: [low, high] of every parameter, the starts are sampled inside them (the fits are not bounded)
+        :param n: number of starts sampled inside the bounds
+        :param p0: an additional start, e.g the user's initial parameters
+        :param seed: seed of the sample, None for a random one (see self.seed)
+        :param processes: number of worker processes, defaults to the number of cores
+        :param callback: called with (number of finished fits, number of fits) whenever a chunk finishes
+        :param is_cancelled: checked whenever a chunk finishes, if it returns True the chunks which did not start are dropped
+        """
+        self.bounds = np.asarray(bounds, dtype=np.float64)
+        if self.bounds.ndim != 2 or self.bounds.shape[1] != 2 or (self.bounds[:, 0] >= self.bounds[:, 1]).any():
+            raise ValueError('Every parameter needs bounds [low, high] with low < high')
+
+        seed_sequence = np.random.SeedSequence(seed)
+        self.seed = seed_sequence.entropy
+        self.starts = latin_hypercube(self.bounds, n, np.random.default_rng(seed_sequence))
+        if p0 is not None:
+            if len(p0) != len(self.bounds):
+                raise ValueError('The number of bounds must match the number of initial parameters')
+            self.starts = np.vstack([p0, self.starts])
+
+        # A few chunks per process, so a slow start does not hold up a whole process
+        nstarts = len(self.starts)
+        chunksize = max(1, nstarts // (4 * (processes or cpu_count() or 1)))
+        chunks = [slice(start, start + chunksize) for start in range(0, nstarts, chunksize)]
+
+        self.ep = np.full(self.starts.shape, np.nan)  # The solution of every start
+        self.chi2 = np.full(nstarts, np.nan)
+
+        tasks = [(multi_start_chunk, (data, colorder, x_range, self.starts[chunk], method, model_path, jit, auto_jacobian))
+                 for chunk in chunks]
+        results = run_pool(tasks, processes, [len(self.chi2[chunk]) for chunk in chunks], callback, is_cancelled)
+        for chunk, result in zip(chunks, results):
+            if result is not None:
+                self.ep[chunk], self.chi2[chunk] = result
+
+        converged = np.isfinite(self.chi2) & np.isfinite(self.ep).all(axis=1)
+        self.nfailed = nstarts - converged.sum()
+        if not converged.any():
+            raise RuntimeError(f'None of the {nstarts} local fits converged, try other bounds')
+
+        best = np.flatnonzero(converged)[np.argmin(self.chi2[converged])]
+        self.minima = self.distinct_minima(self.ep[converged], self.chi2[converged])
+
+        # The best start is fitted again here, to hand back a complete Fit (plots, warm state...)
+        model = load_model(model_path, jit)
+        self.fit = Fit(data, colorder, self.starts[best], model.fit_function, x_range, method, linear=model.linear,
+                       **model.derivatives(method, self.starts[best], auto_jacobian))
+        self.fit.multi_start = self
+
+    @staticmethod
+    def distinct_minima(ep: np.ndarray, chi2: np.ndarray, rtol: float = 1e-6) -> List[tuple]:
+        """
+        Group the solutions whose chi2 agree within rtol, and return (chi2, ep, number of starts) of every group,
+        the best first. ep is the parameters of the lowest chi2 of the group.
+        """
+        order = np.argsort(chi2)
+        minima = []
+        for i in order:
+            if minima and abs(chi2[i] - minima[-1][0]) <= rtol * max(abs(minima[-1][0]), 1e-300):
+                minima[-1][2] += 1
+            else:
+                minima.append([chi2[i], ep[i], 1])
+        return [tuple(minimum) for minimum in minima]
+
+    def __str__(self):
+        nstarts = len(self.starts)
+        best_chi2, _, nbest = self.minima[0]
+
+        str = f'Multi-Start: {nstarts} starts ({self.nfailed} failed), seed = {self.seed}\n'
+        str += f'Bounds = {self.bounds.tolist()}\n'
+        str += f'{nbest} of {nstarts} starts reached the best chi squared ({best_chi2:.6g}), '
+        str += f'{len(self.minima)} distinct minima:\n'
+        for chi2, ep, count in self.minima[:5]:
+            str += f'  chi squared = {chi2:.6g} ({count} starts): {np.array2string(ep, precision=6)}\n'
+        if len(self.minima) > 5:
+            str += f'  ... and {len(self.minima) - 5} more\n'
+        return str
@@ -0,0 +1,86 @@
+from PyQt5.QtWidgets import QTabWidget, QVBoxLayout, QWidget
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg, NavigationToolbar2QT
+from matplotlib.figure import Figure
+
+# The plot methods of Fit size their markers and lines for a 15x12 inch figure
+embedded_scale = 1 / 3
+
+
+class PlotCanvas(QWidget):
+    """
+    A figure embedded in the GUI, which every fit draws on by updating the artists of the previous fit in place.
+
+    The figure is a plain matplotlib Figure and not a pyplot figure, so pyplot never holds a reference to it
+    and there is only ever one figure per canvas, however many fits are run.
+    """
+
+    def __init__(self, kind: str, parent: QWidget = None):
+        """
+        :param kind: 'fit', 'residuals' or 'initial_guess', which plot method of Fit draws on this canvas
+        """
+        super(PlotCanvas, self).__init__(parent)
+
+        self.kind = kind
+        self.figure = Figure(figsize=(6, 4.8))
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.toolbar = NavigationToolbar2QT(self.canvas, self)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.toolbar)
+        layout.addWidget(self.canvas)
+        self.setLayout(layout)
+
+        self.ax = self.figure.add_subplot()
+        self.artists = None
+
+    def show_fit(self, fit, labels: dict, fit_num: int) -> None:
+        """
+        :param labels: title, xlabel, ylabel of the plot
+        """
+        if self.artists is None or not fit.update_plot(self.kind, self.artists, self.ax, labels):
+            self.figure.clear()
+            self.ax = self.figure.add_subplot()
+            if self.kind == 'fit':
+                self.artists = fit.plot_fit(labels['title'], labels['xlabel'], labels['ylabel'], fit_num,
+                                            ax=self.ax, scale=embedded_scale)
+            elif self.kind == 'residuals':
+                self.artists = fit.plot_residuals(labels['xlabel'], labels['ylabel'], fit_num, ax=self.ax, scale=embedded_scale)
+            else:
+                self.artists = fit.plot_initial_guess(labels['xlabel'], labels['ylabel'], fit_num,
+                                                      ax=self.ax, scale=embedded_scale)
+
+        self.toolbar.update()  # The home view of the toolbar is the new fit
+        self.canvas.draw_idle()
+
+
+class PlotPanel(QTabWidget):
+    """
+    The fit, residuals and initial guess plots of the last fit, one tab each.
+    """
+
+    def __init__(self, parent: QWidget = None):
+        super(PlotPanel, self).__init__(parent)
+
+        self.canvases = {'fit': PlotCanvas('fit'),
+                         'residuals': PlotCanvas('residuals'),
+                         'initial_guess': PlotCanvas('initial_guess')}
+        self.addTab(self.canvases['fit'], 'Fit')
+        self.addTab(self.canvases['residuals'], 'Residuals')
+        self.addTab(self.canvases['initial_guess'], 'Initial Guess')
+
+    def show_fit(self, fit, report: dict, fit_num: int) -> None:
+        """
+        Draw the plots which report asks for (see FitGUI.fit) and show the first of them.
+        """
+        plots = [('fit', report['plot_fit'], dict(title=report['title'], xlabel=report['xlabel'], ylabel=report['ylabel'])),
+                 ('residuals', report['plot_residuals'], dict(xlabel=report['xlabel'], ylabel=report['residuals_ylabel'])),
+                 ('initial_guess', report['plot_initial_guess'], dict(xlabel=report['xlabel'], ylabel=report['ylabel']))]
+
+        current = None
+        for i, (kind, enabled, labels) in enumerate(plots):
+            self.setTabEnabled(i, enabled)
+            if enabled:
+                self.canvases[kind].show_fit(fit, labels, fit_num)
+                current = i if current is None else current
+        if current is not None:
+            self.setCurrentIndex(current)
@@ -0,0 +1,54 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, List, Tuple
+
+# Worker processes are spawned, not forked: the GUI forks from a process whose other threads (the fit workers)
+# may hold locks, e.g scipy's ODR_LOCK, and a forked child would inherit such a lock held forever
+mp_context = multiprocessing.get_context('spawn')
+
+
+def process_pool(processes: int = None) -> ProcessPoolExecutor:
+    """
+    A pool of processes spawned by mp_context, which is how every parallel fit, refit and export runs.
+
+    :param processes: number of worker processes, defaults to the number of cores
+    """
+    return ProcessPoolExecutor(max_workers=processes, mp_context=mp_context)
+
+
+def run_pool(tasks: List[Tuple[Callable, tuple]],
+             processes: int = None,
+             sizes: List[int] = None,
+             callback: Callable[[int, int], None] = None,
+             is_cancelled: Callable[[], bool] = None
+             ) -> list:
+    """
+    Run every task, a (function, arguments) pair, on a process pool and return their results in the order of tasks.
+
+    The functions run in spawned processes, so they must be module level functions and their arguments picklable.
+    Models are passed by the path of their script and imported there by load_model, once per process.
+
+    :param processes: number of worker processes, defaults to the number of cores
+    :param sizes: the amount of work of every task (e.g number of refits) by which progress is counted, 1 by default
+    :param callback: called with (finished amount of work, total amount of work) whenever a task finishes
+    :param is_cancelled: checked whenever a task finishes, if it returns True the tasks which did not start are
+    dropped and their results are None
+    """
+    sizes = [1] * len(tasks) if sizes is None else sizes
+    results = [None] * len(tasks)
+
+    with process_pool(processes) as executor:
+        futures = {executor.submit(function, *args): i for i, (function, args) in enumerate(tasks)}
+
+        ndone = 0
+        for future in as_completed(futures):
+            i = futures[future]
+            results[i] = future.result()
+            ndone += sizes[i]
+
+            if callback is not None:
+                callback(ndone, sum(sizes))
+            if is_cancelled is not None and is_cancelled():
+                executor.shutdown(wait=True, cancel_futures=True)
+                break
+    return results
@@ -0,0 +1,151 @@
+import numpy as np
+from time import perf_counter
+from typing import List, Union
+from PyQt5.QtCore import QTimer, Qt, pyqtSignal
+from PyQt5.QtWidgets import QGridLayout, QLabel, QSlider, QVBoxLayout, QWidget
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
+from matplotlib.figure import Figure
+from fit import evaluate_model
+from render import DecimatedErrorbar, decimation_threshold
+
+
+class GuessPreview(QWidget):
+    """
+    The data together with the curve of the initial parameters, redrawn live as the parameters are edited.
+
+    The data is drawn once, only the curve is redrawn: it is evaluated on a small fixed grid and blitted onto a
+    saved background of the rest of the figure, so an update costs about as much as the model evaluation.
+    Updates are debounced, a burst of edits (typing, dragging a slider) is drawn once it pauses for delay ms.
+    Every parameter also has a slider, which spans the value it had when it was typed, +- its magnitude.
+    """
+    params_changed = pyqtSignal(list)  # The parameters were moved by a slider
+
+    slider_steps = 1000
+
+    def __init__(self, parent: QWidget = None, npoints: int = 400, delay: int = 15):
+        """
+        :param npoints: size of the grid the curve is evaluated on
+        :param delay: debounce delay in ms
+        """
+        super(GuessPreview, self).__init__(parent)
+
+        self.npoints = npoints
+        self.func = None
+        self.method = None
+        self.params = None
+        self.xfit = None
+        self.line = None
+        self.background = None
+
+        self.figure = Figure(figsize=(6, 4.8))
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.ax = self.figure.add_subplot()
+        self.canvas.mpl_connect('draw_event', self.save_background)
+
+        self.label_status = QLabel()
+        self.slider_grid = QGridLayout()
+        self.sliders: List[QSlider] = []
+        self.slider_ranges = np.empty((0, 2))
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.canvas)
+        layout.addLayout(self.slider_grid)
+        layout.addWidget(self.label_status)
+        self.setLayout(layout)
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.redraw)
+
+    def set_data(self,
+                 x: np.ndarray,
+                 dx: Union[np.ndarray, None],
+                 y: np.ndarray,
+                 dy: Union[np.ndarray, None],
+                 func,
+                 method: str
+                 ) -> None:
+        """
+        Draw the data (decimated if it is large), the curve of func is drawn by set_params.
+        """
+        self.func = func
+        self.method = method
+        self.xfit = np.linspace(np.min(x), np.max(x), self.npoints)
+
+        self.ax.clear()
+        if len(x) > decimation_threshold:
+            DecimatedErrorbar(self.ax, x, y, dx, dy, label='Data')
+        else:
+            self.ax.errorbar(x, y, yerr=dy, xerr=dx, ls='None', fmt='.', ms=6, capsize=2, elinewidth=1, label='Data')
+        self.ax.autoscale(False)  # The limits are those of the data, a bad guess must not rescale them
+        # Animated artists are left out of regular draws, the curve is only ever blitted
+        self.line, = self.ax.plot(self.xfit, np.full(self.npoints, np.nan), lw=2, color='C1', animated=True,
+                                  label='Initial Guess')
+        self.ax.legend(loc='best')
+        self.ax.grid()
+        self.canvas.draw()
+
+        if self.params is not None:
+            self.timer.start()
+
+    def set_params(self, params: List[float]) -> None:
+        """
+        Show the curve of params (typed by the user), the sliders are centred on them.
+        """
+        self.params = np.asarray(params, dtype=np.float64)
+        self.reset_sliders()
+        self.timer.start()
+
+    def reset_sliders(self) -> None:
+        if len(self.sliders) != len(self.params):
+            while self.slider_grid.count():  # The labels and the sliders
+                self.slider_grid.takeAt(0).widget().deleteLater()
+
+            self.sliders = []
+            for i in range(len(self.params)):
+                slider = QSlider(Qt.Horizontal)
+                slider.setRange(0, self.slider_steps)
+                slider.valueChanged.connect(self.slider_moved)
+                self.slider_grid.addWidget(QLabel(f'a[{i}]'), i, 0)
+                self.slider_grid.addWidget(slider, i, 1)
+                self.sliders.append(slider)
+
+        span = np.maximum(np.abs(self.params), 1)
+        self.slider_ranges = np.column_stack([self.params - span, self.params + span])
+        for slider in self.sliders:
+            slider.blockSignals(True)
+            slider.setValue(self.slider_steps // 2)
+            slider.blockSignals(False)
+
+    def slider_moved(self) -> None:
+        fractions = np.array([slider.value() for slider in self.sliders]) / self.slider_steps
+        self.params = self.slider_ranges[:, 0] + fractions * (self.slider_ranges[:, 1] - self.slider_ranges[:, 0])
+        self.params_changed.emit(self.params.tolist())
+        self.timer.start()
+
+    def save_background(self, event) -> None:
+        """
+        Every full draw (e.g a resize) saves the figure without the curve, which redraw blits the curve onto.
+        """
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        if self.line is not None:
+            self.ax.draw_artist(self.line)
+
+    def redraw(self) -> None:
+        if self.line is None or self.params is None or self.background is None:
+            return
+
+        start = perf_counter()
+        try:
+            self.line.set_ydata(evaluate_model(self.func, self.method, self.params, self.xfit)[0])
+            status = ''
+        except Exception as e:  # e.g the number of parameters does not match the model
+            self.line.set_ydata(np.full(self.npoints, np.nan))
+            status = f'{type(e).__name__}: {e}'
+
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.figure.bbox)
+        self.last_update = perf_counter() - start
+        self.label_status.setText(status or f'Updated in {self.last_update * 1000:.1f} ms')
@@ -0,0 +1,205 @@
+import numpy as np
+from typing import Union
+from matplotlib.collections import LineCollection
+from matplotlib.container import ErrorbarContainer
+
+# Data sets with more points than this are drawn decimated to the screen resolution, see DecimatedErrorbar
+decimation_threshold = 5000
+
+
+class DecimatedErrorbar:
+    """
+    An error bar plot of a large data set, min/max decimated to one bin per horizontal pixel of the axes.
+
+    Every bin is drawn as a vertical bar from the lowest y - dy to the highest y + dy of its points,
+    a horizontal bar from the lowest x - dx to the highest x + dx, and markers at its lowest and highest y,
+    so the outline of the data and of its error bars looks the same as the full plot at a fraction of the artists.
+    Zooming or panning decimates the visible range again, and once few enough points are visible they are drawn
+    one by one. The arrays are only sorted here, the fit always uses the full resolution data.
+    """
+
+    def __init__(self,
+                 ax,
+                 x: np.ndarray,
+                 y: np.ndarray,
+                 dx: Union[np.ndarray, None] = None,
+                 dy: Union[np.ndarray, None] = None,
+                 label: str = None,
+                 ms: float = 4,
+                 lw: float = 1):
+        self.ax = ax
+
+        self.points, = ax.plot([], [], ls='None', marker='o', ms=ms, label=label)
+        color = self.points.get_color()
+        self.ybars = ax.add_collection(LineCollection([], colors=color, linewidths=lw), autolim=False)
+        self.xbars = None if dx is None else ax.add_collection(LineCollection([], colors=color, linewidths=lw), autolim=False)
+
+        # A lambda (not a bound method) so the callback registry keeps this object alive as long as the axes
+        ax.callbacks.connect('xlim_changed', lambda ax: self.update())
+        self.set_data(x, y, dx, dy)
+
+    def set_data(self,
+                 x: np.ndarray,
+                 y: np.ndarray,
+                 dx: Union[np.ndarray, None] = None,
+                 dy: Union[np.ndarray, None] = None
+                 ) -> None:
+        """
+        Show other data with the same artists, dx must be given if and only if it was given to __init__.
+        """
+        order = np.argsort(x, kind='stable')
+        self.x = x[order]
+        self.y = y[order]
+        self.x_low, self.x_high = (None, None) if dx is None else (self.x - dx[order], self.x + dx[order])
+        self.y_low, self.y_high = (self.y, self.y) if dy is None else (self.y - dy[order], self.y + dy[order])
+
+        self.update_datalim()
+        self.ax.autoscale_view()
+        self.update()
+
+    def update_datalim(self) -> None:
+        """
+        The artists only hold the visible bins, so the data limits are set from the full extent of the data.
+        ax.relim() forgets them, call this after it.
+        """
+        x_low = self.x if self.x_low is None else self.x_low
+        x_high = self.x if self.x_high is None else self.x_high
+        self.ax.update_datalim([(np.nanmin(x_low), np.nanmin(self.y_low)), (np.nanmax(x_high), np.nanmax(self.y_high))])
+
+    def update(self) -> None:
+        low, high = self.ax.get_xlim()
+        low, high = min(low, high), max(low, high)
+        nbins = max(int(self.ax.bbox.width), 1)
+
+        visible = slice(np.searchsorted(self.x, low, side='left'), np.searchsorted(self.x, high, side='right'))
+        x, y, y_low, y_high = self.x[visible], self.y[visible], self.y_low[visible], self.y_high[visible]
+
+        if len(x) <= 2 * nbins:  # Few enough points to draw each of them
+            centers, lowest, highest = x, y_low, y_high
+            points_x, points_y = x, y
+            x_low = None if self.x_low is None else self.x_low[visible]
+            x_high = None if self.x_high is None else self.x_high[visible]
+            bars_y = y
+        else:
+            edges = np.linspace(low, high, nbins + 1)[:-1]
+            starts = np.unique(np.searchsorted(x, edges))
+            starts = starts[starts < len(x)]  # The first point of every non empty bin
+
+            centers = (x[starts] + np.maximum.reduceat(x, starts)) / 2
+            y_min = np.minimum.reduceat(y, starts)
+            y_max = np.maximum.reduceat(y, starts)
+            lowest = np.minimum.reduceat(y_low, starts)
+            highest = np.maximum.reduceat(y_high, starts)
+            points_x, points_y = np.concatenate([centers, centers]), np.concatenate([y_min, y_max])
+            x_low = None if self.x_low is None else np.minimum.reduceat(self.x_low[visible], starts)
+            x_high = None if self.x_high is None else np.maximum.reduceat(self.x_high[visible], starts)
+            bars_y = (y_min + y_max) / 2
+
+        self.points.set_data(points_x, points_y)
+        self.ybars.set_segments(np.stack([np.column_stack([centers, lowest]), np.column_stack([centers, highest])], axis=1))
+        if self.xbars is not None:
+            self.xbars.set_segments(np.stack([np.column_stack([x_low, bars_y]), np.column_stack([x_high, bars_y])], axis=1))
+
+
+def bar_segments(low_x: np.ndarray, low_y: np.ndarray, high_x: np.ndarray, high_y: np.ndarray) -> np.ndarray:
+    return np.stack([np.column_stack([low_x, low_y]), np.column_stack([high_x, high_y])], axis=1)
+
+
+def update_errorbar(artist,
+                    x: np.ndarray,
+                    y: np.ndarray,
+                    dx: Union[np.ndarray, None],
+                    dy: Union[np.ndarray, None],
+                    decimated: bool
+                    ) -> bool:
+    """
+    Show other data on an ax.errorbar container or a DecimatedErrorbar in place, without creating artists.
+
+    :param decimated: whether the data should be drawn decimated
+    :return: False if the artist can not show the data (another kind of plot, or dx or dy were added or removed)
+    """
+    if isinstance(artist, DecimatedErrorbar):
+        if not decimated or (artist.xbars is None) != (dx is None):
+            return False
+        artist.set_data(x, y, dx, dy)
+        return True
+
+    if not isinstance(artist, ErrorbarContainer) or decimated:
+        return False
+    if artist.has_xerr != (dx is not None) or artist.has_yerr != (dy is not None):
+        return False
+
+    # The caplines are (x low, x high, y low, y high) and the bars (x, y), of the errors which exist
+    data_line, caplines, barlinecols = artist.lines
+    data_line.set_data(x, y)
+    caplines, barlinecols = list(caplines), list(barlinecols)
+    if dx is not None:
+        if caplines:
+            caplines.pop(0).set_data(x - dx, y)
+            caplines.pop(0).set_data(x + dx, y)
+        barlinecols.pop(0).set_segments(bar_segments(x - dx, y, x + dx, y))
+    if dy is not None:
+        if caplines:
+            caplines.pop(0).set_data(x, y - dy)
+            caplines.pop(0).set_data(x, y + dy)
+        barlinecols.pop(0).set_segments(bar_segments(x, y - dy, x, y + dy))
+    return True
+
+
+def adaptive_samples(func,
+                     low: float,
+                     high: float,
+                     pixels: int = 1000,
+                     log: bool = False,
+                     tolerance: float = 0.25
+                     ) -> tuple:
+    """
+    Sample a curve y = func(x) densely where it bends and sparsely where it is straight, for plotting it.
+
+    The curve starts as one point per 8 pixels. Then every interval whose midpoint is further than tolerance pixels
+    from the straight line between its ends is split, as if the curve was drawn pixels wide and pixels high,
+    until no interval deviates or the budget of 2 * pixels points is used up (by the most deviating intervals).
+    func must be vectorized, every round of splitting evaluates all the new midpoints in one call.
+
+    :param log: split the intervals in log(x) instead of x, for positive x spanning decades
+    :return: x, y
+    """
+    to_x = np.exp if log else np.asarray
+    u_low, u_high = (np.log(low), np.log(high)) if log else (low, high)
+
+    u = np.linspace(u_low, u_high, max(pixels // 8, 16) + 1)
+    y = func(to_x(u))
+    budget = 2 * pixels
+    min_width = (u_high - u_low) * 1e-9
+
+    while len(u) < budget:
+        splittable = np.flatnonzero(np.diff(u) > min_width)
+        mid = (u[splittable] + u[splittable + 1]) / 2
+        y_mid = func(to_x(mid))
+
+        with np.errstate(invalid='ignore'):
+            finite = np.concatenate([y[np.isfinite(y)], y_mid[np.isfinite(y_mid)]])
+            span = finite.max() - finite.min() if len(finite) else 0
+            scale = span / pixels if span > 0 else 1  # y units per pixel
+            deviation = np.abs(y_mid - (y[splittable] + y[splittable + 1]) / 2) / scale
+        deviation[~np.isfinite(deviation)] = 0  # Poles and undefined regions are not refined
+
+        split = np.flatnonzero(deviation > tolerance)
+        if len(split) == 0:
+            break
+        room = budget - len(u)
+        if len(split) > room:
+            split = split[np.argsort(deviation[split])[-room:]]
+            split.sort()
+
+        u = np.insert(u, splittable[split] + 1, mid[split])
+        y = np.insert(y, splittable[split] + 1, y_mid[split])
+
+    return to_x(u), y
+
+
+def plot_pixels(ax) -> int:
+    """
+    The width of ax in pixels, the resolution which a curve on it needs.
+    """
+    return max(int(ax.bbox.width), 100)
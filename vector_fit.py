@@ -0,0 +1,159 @@
+import numpy as np
+from typing import List, Union
+from scipy.stats import chi2
+
+
+class VectorFit:
+    """
+    Fits one model to many datasets which share the same x, all at once.
+
+    Every dataset (a row of y) is fitted by its own Levenberg-Marquardt iteration, but each iteration of all the
+    datasets is carried out by a few vectorized NumPy operations instead of a scipy call per dataset.
+    The model is evaluated once for all the rows, with every parameter given as a column vector (shape (m, 1)),
+    hence "fit_function" must be written with NumPy operations which broadcast (as the example scripts are).
+
+    Both model conventions are accepted, but both are solved by least squares in y:
+    'ls' for fit_function(x, a0, a1, ...) and 'odr' for fit_function(a, x). x errors are not taken into account.
+    The results follow curve_fit's conventions, the covariance matrix is scaled by the reduced chi squared.
+    """
+
+    def __init__(self,
+                 x: np.ndarray,
+                 y: np.ndarray,
+                 p0: Union[List[float], np.ndarray],
+                 func,
+                 dy: Union[np.ndarray, None] = None,
+                 method: str = 'ls',
+                 maxit: int = 200,
+                 ftol: float = 1e-10,
+                 xtol: float = 1e-10):
+        """
+        :param x: (n,) the x of every dataset
+        :param y: (m, n) one dataset per row
+        :param p0: (p,) initial parameters of every dataset, or (m, p) one row per dataset
+        :param dy: None, (n,) the same errors for every dataset or (m, n) one row per dataset
+        :param method: the convention of func, 'ls' or 'odr'
+        :param maxit: maximal number of iterations
+        :param ftol: a dataset converged once an accepted step decreases its chi2 by less than this fraction
+        :param xtol: or once an accepted step changes every parameter by less than this fraction
+        """
+        self.x = np.asarray(x, dtype=np.float64)
+        self.y = np.atleast_2d(np.asarray(y, dtype=np.float64))
+        self.ndatasets, self.npoints = self.y.shape
+
+        self.fitting_func = func
+        self.method = method
+        if method not in ('ls', 'odr'):
+            raise ValueError("'method' must be 'ls' or 'odr'")
+
+        self.weights = None if dy is None else np.broadcast_to(1 / np.asarray(dy, dtype=np.float64), self.y.shape)
+
+        self.init_params = np.broadcast_to(np.asarray(p0, dtype=np.float64), (self.ndatasets, np.shape(p0)[-1])).copy()
+        self.nparams = self.init_params.shape[1]
+
+        self.ep, self.chi2, self.nit, self.success, self.nfev = self.levenberg_marquardt(maxit, ftol, xtol)
+
+        jac = self.jacobian(self.ep, np.arange(self.ndatasets), self.evaluate(self.ep, np.arange(self.ndatasets)))
+        self.dof = self.npoints - self.nparams
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.cov_ep = np.linalg.pinv(np.einsum('mni,mnj->mij', jac, jac)) * (self.chi2 / self.dof)[:, None, None]
+            # As curve_fit: a parameter which does not affect the model (a singular Jacobian) has no finite covariance
+            singular_values = np.linalg.svd(np.nan_to_num(jac), compute_uv=False)
+            threshold = np.finfo(np.float64).eps * max(jac.shape[1:]) * singular_values[:, :1]
+            undetermined = (singular_values <= threshold).any(axis=1) | np.isnan(self.cov_ep).any(axis=(1, 2))
+            self.cov_ep[undetermined] = np.inf
+        self.sd_ep = np.sqrt(np.diagonal(self.cov_ep, axis1=1, axis2=2))
+
+        self.pvalue = chi2.sf(self.chi2, self.dof)
+        self.chi2red = self.chi2 / self.dof
+
+    def __str__(self):
+        str = f'{self.ndatasets} datasets, {self.success.sum()} converged\n'
+        str += f'DoF = {self.dof}\n'
+        str += f'median chi squared reduced = {np.median(self.chi2red):.2f}\n'
+        return str
+
+    def evaluate(self, params: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """
+        The model of the given rows, (len(rows), n), params is (len(rows), p).
+        """
+        x = self.x[np.newaxis, :]
+        if self.method == 'odr':
+            result = self.fitting_func(params.T[:, :, np.newaxis], x)
+        else:
+            result = self.fitting_func(x, *[params[:, i, np.newaxis] for i in range(self.nparams)])
+        return np.broadcast_to(result, (len(rows), self.npoints))
+
+    def weighted(self, a: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        if self.weights is None:
+            return a
+        weights = self.weights[rows]
+        return a * (weights if a.ndim == 2 else weights[..., np.newaxis])
+
+    def jacobian(self, params: np.ndarray, rows: np.ndarray, model: np.ndarray) -> np.ndarray:
+        """
+        The weighted (len(rows), n, p) forward differences Jacobian of the model of the given rows.
+        """
+        steps = np.sqrt(np.finfo(np.float64).eps) * np.maximum(np.abs(params), 1)
+        jac = np.empty((len(rows), self.npoints, self.nparams))
+        for i in range(self.nparams):
+            shifted = params.copy()
+            shifted[:, i] += steps[:, i]
+            jac[:, :, i] = (self.evaluate(shifted, rows) - model) / steps[:, i, np.newaxis]
+        return self.weighted(jac, rows)
+
+    def levenberg_marquardt(self, maxit: int, ftol: float, xtol: float) -> tuple:
+        params = self.init_params.copy()
+        rows = np.arange(self.ndatasets)
+
+        model = self.evaluate(params, rows)
+        residuals = self.weighted(self.y - model, rows)
+        chi2 = np.einsum('mn,mn->m', residuals, residuals)
+        jac = self.jacobian(params, rows, model)
+
+        damping = np.full(self.ndatasets, 1e-3)
+        nit = np.zeros(self.ndatasets, dtype=int)
+        nfev = np.full(self.ndatasets, 1 + self.nparams)
+        success = np.zeros(self.ndatasets, dtype=bool)
+        active = rows[np.isfinite(chi2)]  # The datasets which did not converge yet, a non finite chi2 can not improve
+
+        for _ in range(maxit):
+            if len(active) == 0:
+                break
+
+            j = jac[active]
+            jtj = np.einsum('mni,mnj->mij', j, j)
+            jtr = np.einsum('mni,mn->mi', j, residuals[active])
+
+            diagonal = np.diagonal(jtj, axis1=1, axis2=2)
+            damped = jtj + (damping[active, np.newaxis] * np.maximum(diagonal, 1e-12))[:, :, np.newaxis] * np.eye(self.nparams)
+            step = np.linalg.solve(damped, jtr[:, :, np.newaxis])[:, :, 0]
+
+            trial = params[active] + step
+            with np.errstate(all='ignore'):
+                trial_model = self.evaluate(trial, active)
+                trial_residuals = self.weighted(self.y[active] - trial_model, active)
+                trial_chi2 = np.einsum('mn,mn->m', trial_residuals, trial_residuals)
+            nfev[active] += 1
+            nit[active] += 1
+
+            accepted = np.isfinite(trial_chi2) & (trial_chi2 <= chi2[active])
+            damping[active] = np.where(accepted, damping[active] / 10, damping[active] * 10)
+
+            accepted_rows = active[accepted]
+            converged = accepted & ((chi2[active] - trial_chi2 <= ftol * chi2[active]) |
+                                    (np.abs(step) <= xtol * (np.abs(params[active]) + xtol)).all(axis=1))
+            # A step which the damping can no longer shrink means that the minimum was reached, if the chi2 is finite
+            stalled = ~accepted & (damping[active] > 1e16)
+
+            params[accepted_rows] = trial[accepted]
+            chi2[accepted_rows] = trial_chi2[accepted]
+            residuals[accepted_rows] = trial_residuals[accepted]
+            if len(accepted_rows):
+                jac[accepted_rows] = self.jacobian(params[accepted_rows], accepted_rows, trial_model[accepted])
+                nfev[accepted_rows] += self.nparams
+
+            success[active[converged | (stalled & np.isfinite(chi2[active]))]] = True
+            active = active[~(converged | stalled)]
+
+        return params, chi2, nit, success, nfev